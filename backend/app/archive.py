@@ -0,0 +1,166 @@
+# backend/app/archive.py
+import os
+import gzip
+import json
+import time
+import zlib
+import logging
+from datetime import datetime, timezone
+
+from .batching import BatchingWorker
+
+logger = logging.getLogger("archive")
+
+
+def parse_time(value):
+    """
+    Accept epoch seconds or an ISO-8601 string; returns epoch seconds or None.
+    ISO strings without an offset are UTC, not the host's local time.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        dt = datetime.fromisoformat(value)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+
+
+def parse_utc(value):
+    """parse_time() as a naive UTC datetime (how the database stores timestamps), or None."""
+    ts = parse_time(value)
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+class JsonlArchive(BatchingWorker):
+    """
+    Append-only archive of JSON records.
+
+    Callers append() records to an in-memory queue and return immediately; a
+    background thread writes them in batches to gzip-compressed JSONL segments.
+    Each batch is written as its own gzip member, so a crash never corrupts
+    earlier data. Segments rotate by size/age and old segments are deleted by
+    age and total-size retention. Segment files are named
+    `<prefix>-<start epoch ms>.jsonl.gz`, so name order is time order.
+    """
+    def __init__(self, directory: str, prefix: str = "records",
+                 max_segment_bytes: int = 16 * 1024 * 1024, max_segment_age: float = 3600.0,
+                 retention_days: float = 30.0, max_total_bytes: int = 1024 * 1024 * 1024,
+                 batch_size: int = 256, flush_interval: float = 1.0, max_pending: int = 10000):
+        super().__init__(f"archive-{prefix}", batch_size=batch_size, flush_interval=flush_interval, max_pending=max_pending)
+        self.directory = directory
+        self.prefix = prefix
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.retention_seconds = retention_days * 86400.0
+        self.max_total_bytes = max_total_bytes
+        self._segment = None
+        self._segment_started = 0.0
+
+    # ---- writer side ----
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return super().start()
+
+    def append(self, record: dict) -> bool:
+        """Enqueue a record without blocking. Returns False if it had to be dropped."""
+        record.setdefault("ts", time.time())
+        return self.submit(record)
+
+    def process_batch(self, batch):
+        self._write_batch(batch)
+
+    def maintenance(self):
+        self._enforce_retention()
+
+    def _current_segment(self, now: float) -> str:
+        if self._segment is not None:
+            too_big = os.path.exists(self._segment) and os.path.getsize(self._segment) >= self.max_segment_bytes
+            too_old = now - self._segment_started >= self.max_segment_age
+            if not (too_big or too_old):
+                return self._segment
+        self._segment_started = now
+        self._segment = os.path.join(self.directory, f"{self.prefix}-{int(now * 1000):013d}.jsonl.gz")
+        return self._segment
+
+    def _write_batch(self, batch):
+        data = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in batch).encode("utf-8")
+        path = self._current_segment(time.time())
+        with open(path, "ab") as f:
+            f.write(gzip.compress(data))
+
+    def _enforce_retention(self):
+        segments = self.segments()
+        cutoff = time.time() - self.retention_seconds
+        total = sum(size for _, _, size in segments)
+        # keep the newest segment; it may still be written to
+        for i, (path, start, size) in enumerate(segments[:-1]):
+            next_start = segments[i + 1][1]
+            if next_start < cutoff or total > self.max_total_bytes:
+                os.remove(path)
+                total -= size
+                logger.info(f"Archive retention removed {path}")
+
+    # ---- reader side ----
+    def segments(self):
+        """List (path, start_ts, size) for all segments, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        out = []
+        head = f"{self.prefix}-"
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith(head) and name.endswith(".jsonl.gz")):
+                continue
+            try:
+                start = int(name[len(head):-len(".jsonl.gz")]) / 1000.0
+            except ValueError:
+                continue
+            path = os.path.join(self.directory, name)
+            out.append((path, start, os.path.getsize(path)))
+        return out
+
+    def query(self, start: float = None, end: float = None, limit: int = None):
+        """
+        Return records with start <= ts < end (either bound optional), oldest first.
+        Only segments whose time span overlaps the range are opened.
+        """
+        results = []
+        segments = self.segments()
+        for i, (path, seg_start, _) in enumerate(segments):
+            seg_end = segments[i + 1][1] if i + 1 < len(segments) else float("inf")
+            if (end is not None and seg_start >= end) or (start is not None and seg_end < start):
+                continue
+            for record in self._read_segment(path):
+                ts = record.get("ts", 0)
+                if (start is not None and ts < start) or (end is not None and ts >= end):
+                    continue
+                results.append(record)
+                if limit and len(results) >= limit:
+                    return results
+        return results
+
+    @staticmethod
+    def _read_segment(path):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except (EOFError, OSError, zlib.error):
+            # a member may be mid-write; everything before it is intact
+            return
+
+    def stats(self):
+        segments = self.segments()
+        return {
+            "directory": self.directory,
+            "segments": len(segments),
+            "bytes": sum(size for _, _, size in segments),
+            **super().stats(),
+        }
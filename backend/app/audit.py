@@ -0,0 +1,255 @@
+# backend/app/audit.py
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlmodel import Session, select, delete
+
+from .batching import BatchingWorker
+from .metrics import stage
+from .models import AuditEvent, AuditRollup
+
+logger = logging.getLogger("audit")
+
+# rows are claimed and rolled up in chunks of this many events
+RETENTION_CHUNK = 5000
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+class AuditBlobStore:
+    """
+    Content-addressed store for large audit payloads.
+    Payloads are compressed (zstd if installed, else gzip) and stored as
+    <dir>/<sha[:2]>/<sha><ext>, where sha is the sha256 of the uncompressed bytes,
+    so identical payloads are stored once.
+
+    Writers in other processes may reuse a blob while retention deletes it:
+    put() refreshes the mtime of a blob it reuses, and delete_unused() only
+    removes blobs that have not been touched for `delete_grace` seconds.
+    """
+    def __init__(self, directory: str = "./data/audit_blobs", delete_grace: float = 3600.0):
+        self.directory = directory
+        self.delete_grace = delete_grace
+        self.ext = ".json.zst" if ZSTD_AVAILABLE else ".json.gz"
+
+    def _path(self, digest: str, ext: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest + ext)
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest, self.ext)
+        try:
+            os.utime(path)
+            return digest
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if ZSTD_AVAILABLE:
+            blob = zstandard.ZstdCompressor(level=6).compress(data)
+        else:
+            blob = gzip.compress(data, compresslevel=6)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        for ext in (".json.zst", ".json.gz"):
+            path = self._path(digest, ext)
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                blob = f.read()
+            if ext == ".json.zst":
+                if not ZSTD_AVAILABLE:
+                    raise RuntimeError("zstandard is required to read this audit payload")
+                return zstandard.ZstdDecompressor().decompress(blob)
+            return gzip.decompress(blob)
+        return None
+
+    def delete_unused(self, digest: str):
+        """Delete a blob no row references, unless a writer touched it within delete_grace."""
+        for ext in (".json.zst", ".json.gz"):
+            path = self._path(digest, ext)
+            doomed = f"{path}.{os.getpid()}.del"
+            try:
+                # after the rename a concurrent put() no longer finds the blob and writes it again
+                os.rename(path, doomed)
+            except OSError:
+                continue
+            if time.time() - os.stat(doomed).st_mtime < self.delete_grace:
+                os.replace(doomed, path)
+            else:
+                os.remove(doomed)
+
+
+class AuditWriter(BatchingWorker):
+    """
+    Background audit log.
+    Handlers call log() and return immediately; batches of events are
+    serialised, large payloads are moved to the blob store (only the digest
+    and a small summary stay in the row), and the rows are inserted with one
+    commit per batch. Events older than `retention_days` are rolled up into
+    daily AuditRollup counts and deleted.
+
+    When the queue is full, log() waits up to `submit_timeout` seconds rather
+    than dropping the event; drops are counted in
+    intellicure_background_dropped_total{writer="audit"}.
+    """
+    def __init__(self, engine, blob_dir: str = "./data/audit_blobs", inline_max_bytes: int = 2048,
+                 retention_days: float = 90.0, batch_size: int = 200, flush_interval: float = 0.5,
+                 submit_timeout: float = 2.0):
+        super().__init__("audit", batch_size=batch_size, flush_interval=flush_interval, maintenance_interval=3600.0)
+        self.engine = engine
+        self.blobs = AuditBlobStore(blob_dir)
+        self.inline_max_bytes = inline_max_bytes
+        self.retention_days = retention_days
+        self.submit_timeout = submit_timeout
+
+    def log(self, action: str, user: str = None, payload=None, summary: dict = None) -> bool:
+        """Queue an audit event. `payload` is any JSON-serialisable object."""
+        return self.submit({
+            # naive UTC, like every other stored timestamp
+            "timestamp": datetime.now(timezone.utc).replace(tzinfo=None),
+            "action": action,
+            "user": user,
+            "payload": payload,
+            "summary": summary,
+        }, timeout=self.submit_timeout)
+
+    def _to_row(self, item) -> AuditEvent:
+        ev = AuditEvent(timestamp=item["timestamp"], action=item["action"], user=item["user"])
+        if item["summary"] is not None:
+            ev.summary = json.dumps(item["summary"], default=str)
+        if item["payload"] is not None:
+            data = json.dumps(item["payload"], default=str, separators=(",", ":")).encode("utf-8")
+            ev.payload_size = len(data)
+            if len(data) <= self.inline_max_bytes:
+                ev.resource = data.decode("utf-8")
+            else:
+                ev.payload_digest = self.blobs.put(data)
+        return ev
+
+    def process_batch(self, batch):
+        rows = [self._to_row(item) for item in batch]
+        with Session(self.engine) as session:
+            session.add_all(rows)
+            with stage("audit_commit"):
+                session.commit()
+
+    def maintenance(self):
+        self.apply_retention()
+
+    def apply_retention(self, retention_days: float = None):
+        """
+        Roll up events older than the retention window into daily counts, delete them
+        and remove payload blobs no longer referenced. Returns the number of events removed.
+
+        Every worker process runs this. Events are claimed by deleting them, and a
+        chunk is rolled back if another process deleted any of its events first,
+        so no event is counted twice.
+        """
+        days = self.retention_days if retention_days is None else retention_days
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+        removed, digests = 0, set()
+        while True:
+            with Session(self.engine) as session:
+                events = session.exec(
+                    select(AuditEvent.id, AuditEvent.timestamp, AuditEvent.action, AuditEvent.user,
+                           AuditEvent.payload_size, AuditEvent.payload_digest)
+                    .where(AuditEvent.timestamp < cutoff)
+                    .order_by(AuditEvent.id)
+                    .limit(RETENTION_CHUNK)
+                ).all()
+                if not events:
+                    break
+                ids = [e.id for e in events]
+                deleted = session.exec(delete(AuditEvent).where(AuditEvent.id.in_(ids))).rowcount
+                if deleted != len(ids):
+                    session.rollback()
+                    logger.info("Audit retention is running in another process; skipping")
+                    break
+                groups = {}
+                for e in events:
+                    key = (e.timestamp.date().isoformat(), e.action, e.user)
+                    count, size = groups.get(key, (0, 0))
+                    groups[key] = (count + 1, size + (e.payload_size or 0))
+                for (d, action, user), (count, size) in groups.items():
+                    roll = session.exec(select(AuditRollup).where(
+                        AuditRollup.day == d, AuditRollup.action == action, AuditRollup.user == user)).first()
+                    if roll is None:
+                        roll = AuditRollup(day=d, action=action, user=user)
+                    roll.count += count
+                    roll.payload_bytes += size
+                    session.add(roll)
+                session.commit()
+            removed += len(ids)
+            digests.update(e.payload_digest for e in events if e.payload_digest)
+        if digests:
+            with Session(self.engine) as session:
+                still_used = set(session.exec(
+                    select(AuditEvent.payload_digest).where(AuditEvent.payload_digest.in_(digests))
+                ).all())
+            for digest in digests - still_used:
+                self.blobs.delete_unused(digest)
+        if removed:
+            logger.info(f"Audit retention rolled up {removed} events older than {cutoff.isoformat()}")
+        return removed
+
+    def query(self, action: str = None, user: str = None, since: datetime = None, until: datetime = None,
+              limit: int = 100):
+        """Most recent events first; payloads are not loaded (see payload())."""
+        stmt = select(AuditEvent)
+        if action:
+            stmt = stmt.where(AuditEvent.action == action)
+        if user:
+            stmt = stmt.where(AuditEvent.user == user)
+        if since:
+            stmt = stmt.where(AuditEvent.timestamp >= since)
+        if until:
+            stmt = stmt.where(AuditEvent.timestamp < until)
+        stmt = stmt.order_by(AuditEvent.timestamp.desc(), AuditEvent.id.desc()).limit(limit)
+        with Session(self.engine) as session:
+            events = session.exec(stmt).all()
+        return [{
+            "id": e.id,
+            "timestamp": e.timestamp.isoformat(),
+            "user": e.user,
+            "action": e.action,
+            "summary": json.loads(e.summary) if e.summary else None,
+            "payload_digest": e.payload_digest,
+            "payload_size": e.payload_size,
+            "inline": e.resource is not None,
+        } for e in events]
+
+    def rollups(self, action: str = None, limit: int = 366):
+        stmt = select(AuditRollup)
+        if action:
+            stmt = stmt.where(AuditRollup.action == action)
+        stmt = stmt.order_by(AuditRollup.day.desc()).limit(limit)
+        with Session(self.engine) as session:
+            return [r.model_dump() for r in session.exec(stmt).all()]
+
+    def payload(self, event_id: int):
+        """Return the decoded payload of one event (inline or from the blob store)."""
+        with Session(self.engine) as session:
+            ev = session.get(AuditEvent, event_id)
+        if ev is None:
+            return None
+        if ev.resource is not None:
+            return json.loads(ev.resource)
+        if ev.payload_digest:
+            data = self.blobs.get(ev.payload_digest)
+            return json.loads(data) if data is not None else None
+        return None
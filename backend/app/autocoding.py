@@ -0,0 +1,254 @@
+# backend/app/autocoding.py
+import json
+import uuid
+import time
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, update
+from sqlmodel import Session, select, func
+
+from .models import ConditionRecord, CodingJob, CodingSuggestion
+from .executor import ExecutorOverloaded
+
+logger = logging.getLogger("autocoding")
+
+
+def missing_side(row: dict):
+    """Return "icd" / "namaste" when exactly one side of the dual code is present, else None."""
+    has_namaste = bool(row.get("namaste_code"))
+    has_icd = bool(row.get("icd_code"))
+    if has_namaste and not has_icd:
+        return "icd"
+    if has_icd and not has_namaste:
+        return "namaste"
+    return None
+
+
+def enqueue_coding_jobs(session: Session, condition_ids, rows) -> int:
+    """
+    Queue auto-coding for freshly inserted Conditions that lack one side of the
+    dual code. Runs in the caller's transaction (no commit), so a job exists
+    if and only if its Condition was committed.
+    """
+    now = datetime.utcnow()
+    jobs = []
+    for cid, row in zip(condition_ids, rows):
+        target = missing_side(row)
+        if target:
+            jobs.append({"condition_id": cid, "target": target, "status": "pending", "attempts": 0, "created_at": now})
+    if jobs:
+        session.execute(insert(CodingJob), jobs)
+    return len(jobs)
+
+
+class AutoCoder:
+    """
+    Background worker for the CodingJob queue.
+    The queue lives in the database: jobs are claimed in batches of `batch_size`
+    with a single UPDATE, so several worker processes can share it. For a batch,
+    all NAMASTE displays are embedded in one forward pass and searched against the
+    ICD index with one FAISS call; Conditions missing the NAMASTE side are coded
+    from the ConceptMap with one lookup. Ranked suggestions are written to
+    CodingSuggestion with their provenance; the Condition itself is not modified.
+    Jobs left running by a crashed worker are re-queued after `stale_after` seconds.
+    Searches run on `executor` (the API's BoundedExecutor) when given; jobs are
+    only claimed while the model and the index are loaded, otherwise they stay pending.
+    """
+    def __init__(self, engine, faiss_svc, embed_svc, namaste_lookup, batch_size: int = 64, k: int = 5,
+                 poll_interval: float = 5.0, stale_after: float = 600.0, max_attempts: int = 3, executor=None):
+        self.engine = engine
+        self.faiss_svc = faiss_svc
+        self.embed_svc = embed_svc
+        self.executor = executor
+        self.namaste_lookup = namaste_lookup
+        self.batch_size = batch_size
+        self.k = k
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_ms = None
+        self.last_error = None
+        self.overloaded = 0
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="autocoder", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def wake(self):
+        """Tell the worker that new jobs were committed."""
+        self._wake.set()
+
+    def close(self, timeout: float = 10.0):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        last_sweep = 0.0
+        while not self._stopping.is_set():
+            if time.monotonic() - last_sweep > self.poll_interval:
+                last_sweep = time.monotonic()
+                try:
+                    self.requeue_stale()
+                except Exception:
+                    logger.exception("autocoder: stale job sweep failed")
+            try:
+                n = self.run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("autocoder: batch failed")
+                n = 0
+            if n == 0:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    # ---- queue ----
+    def claim(self, limit: int) -> str:
+        """Atomically mark up to `limit` pending jobs as running; returns the claim token."""
+        token = uuid.uuid4().hex
+        pending = (select(CodingJob.id).where(CodingJob.status == "pending")
+                   .order_by(CodingJob.id).limit(limit).scalar_subquery())
+        with self.engine.begin() as conn:
+            conn.execute(update(CodingJob)
+                         .where(CodingJob.id.in_(pending), CodingJob.status == "pending")
+                         .values(status="running", claimed_by=token, claimed_at=datetime.utcnow(),
+                                 attempts=CodingJob.attempts + 1))
+        return token
+
+    def requeue_stale(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        stale = (CodingJob.status == "running", CodingJob.claimed_at < cutoff)
+        with self.engine.begin() as conn:
+            failed = conn.execute(update(CodingJob).where(*stale, CodingJob.attempts >= self.max_attempts)
+                                  .values(status="failed", error="worker did not finish the job")).rowcount
+            requeued = conn.execute(update(CodingJob).where(*stale).values(status="pending", claimed_by=None)).rowcount
+        if failed or requeued:
+            logger.warning(f"autocoder: re-queued {requeued} and failed {failed} stale jobs")
+        return requeued
+
+    def ready(self) -> bool:
+        return self.faiss_svc.index_loaded and self.embed_svc.model_loaded
+
+    def run_once(self) -> int:
+        """Claim and code one batch. Returns the number of jobs processed."""
+        if not self.ready():
+            return 0
+        token = self.claim(self.batch_size)
+        with Session(self.engine) as session:
+            jobs = session.exec(select(CodingJob).where(CodingJob.claimed_by == token,
+                                                        CodingJob.status == "running")).all()
+            if not jobs:
+                return 0
+            start = time.perf_counter()
+            try:
+                self._code_batch(session, jobs)
+                session.commit()
+            except ExecutorOverloaded:
+                # the API is busy: back off without spending an attempt
+                session.rollback()
+                self._requeue(jobs)
+                self.overloaded += 1
+                return 0
+            except Exception as e:
+                session.rollback()
+                self._release(jobs, str(e))
+                raise
+        self.processed += len(jobs)
+        self.batches += 1
+        self.last_batch_ms = round((time.perf_counter() - start) * 1000, 1)
+        return len(jobs)
+
+    def _requeue(self, jobs):
+        with self.engine.begin() as conn:
+            conn.execute(update(CodingJob).where(CodingJob.id.in_([j.id for j in jobs]))
+                         .values(status="pending", claimed_by=None, attempts=CodingJob.attempts - 1))
+
+    def _release(self, jobs, error: str):
+        with self.engine.begin() as conn:
+            for job in jobs:
+                status = "failed" if job.attempts >= self.max_attempts else "pending"
+                if status == "failed":
+                    self.failed += 1
+                conn.execute(update(CodingJob).where(CodingJob.id == job.id)
+                             .values(status=status, claimed_by=None, error=error[:500]))
+
+    # ---- coding ----
+    def _search_icd(self, texts):
+        search = self.faiss_svc.search_batch_with_embedding
+        if self.executor is not None:
+            results = self.executor.call(search, texts, self.embed_svc, k=self.k)
+        else:
+            results = search(texts, self.embed_svc, k=self.k)
+        return {"method": "faiss", "model": self.embed_svc.model_dir, "index": self.faiss_svc.index_path}, results
+
+    def _code_batch(self, session: Session, jobs):
+        ids = [j.condition_id for j in jobs]
+        conds = {c.id: c for c in session.exec(select(ConditionRecord).where(ConditionRecord.id.in_(ids)))}
+        now = datetime.utcnow()
+        suggestions = []
+
+        def add(job, rank, code, display, score, provenance):
+            suggestions.append(CodingSuggestion(
+                condition_id=job.condition_id, job_id=job.id, target=job.target, rank=rank, code=code,
+                display=display, score=score, provenance=json.dumps(provenance), created_at=now))
+
+        icd_jobs = [j for j in jobs if j.target == "icd" and j.condition_id in conds]
+        if icd_jobs:
+            texts = [conds[j.condition_id].namaste_display or conds[j.condition_id].namaste_code for j in icd_jobs]
+            source, results = self._search_icd(texts)
+            for job, text, cands in zip(icd_jobs, texts, results):
+                for rank, c in enumerate(cands, 1):
+                    add(job, rank, c.get("icd_code"), c.get("icd_term"), c.get("score"),
+                        {**source, "query": text, "job_id": job.id})
+
+        namaste_jobs = [j for j in jobs if j.target == "namaste" and j.condition_id in conds]
+        if namaste_jobs:
+            mapped = self.namaste_lookup([conds[j.condition_id].icd_code for j in namaste_jobs])
+            for job in namaste_jobs:
+                icd_code = conds[job.condition_id].icd_code
+                for rank, m in enumerate(mapped.get(icd_code, []), 1):
+                    add(job, rank, m["namaste_code"], None, m["confidence"],
+                        {"method": "conceptmap", "icd_code": icd_code, "equivalence": m["equivalence"],
+                         "job_id": job.id})
+
+        session.add_all(suggestions)
+        for job in jobs:
+            job.status = "done"
+            job.finished_at = now
+            job.error = None if job.condition_id in conds else "condition not found"
+            session.add(job)
+
+    # ---- reporting ----
+    def queue_counts(self):
+        with Session(self.engine) as session:
+            rows = session.exec(select(CodingJob.status, func.count(CodingJob.id)).group_by(CodingJob.status)).all()
+        return {status: count for status, count in rows}
+
+    def stats(self):
+        return {
+            "running": self._thread is not None,
+            "batch_size": self.batch_size,
+            "processed": self.processed,
+            "failed": self.failed,
+            "overloaded": self.overloaded,
+            "batches": self.batches,
+            "last_batch_ms": self.last_batch_ms,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,125 @@
+# backend/app/batching.py
+import time
+import queue
+import atexit
+import logging
+import threading
+
+from .metrics import BACKGROUND_DROPPED
+
+logger = logging.getLogger("batching")
+
+
+class BatchingWorker:
+    """
+    Base class for background writers.
+    Producers submit() items (blocking for at most `timeout` when the queue is
+    full); one daemon thread drains the
+    queue in batches of up to `batch_size` (or whatever arrived within
+    `flush_interval`) and hands them to process_batch(). maintenance() runs
+    every `maintenance_interval` seconds on the same thread.
+    """
+    def __init__(self, name: str, batch_size: int = 256, flush_interval: float = 1.0,
+                 max_pending: int = 10000, maintenance_interval: float = 60.0):
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.maintenance_interval = maintenance_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._stopping = threading.Event()
+        self.processed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.last_error = None
+
+    def process_batch(self, batch):
+        raise NotImplementedError
+
+    def maintenance(self):
+        pass
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def submit(self, item, timeout: float = 0.0) -> bool:
+        """
+        Enqueue an item. If the queue is full, wait up to `timeout` seconds for
+        room. Returns False if it had to be dropped.
+        """
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        try:
+            if timeout > 0:
+                self._queue.put(item, timeout=timeout)
+                return True
+        except queue.Full:
+            pass
+        self.dropped += 1
+        BACKGROUND_DROPPED.inc(self.name)
+        logger.warning(f"{self.name} queue full; dropping item")
+        return False
+
+    def flush(self, timeout: float = 10.0):
+        """Block until everything submitted so far has been processed."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self, timeout: float = 10.0):
+        if self._thread is None:
+            return
+        self.flush(timeout)
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        last_maintenance = time.monotonic()
+        while not self._stopping.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.process_batch(batch)
+                    self.processed += len(batch)
+                    self.batches += 1
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.exception(f"{self.name}: failed to process batch of {len(batch)}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+            if time.monotonic() - last_maintenance > self.maintenance_interval:
+                last_maintenance = time.monotonic()
+                try:
+                    self.maintenance()
+                except Exception:
+                    logger.exception(f"{self.name}: maintenance failed")
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize(),
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,54 @@
+# backend/app/coalesce.py
+import asyncio
+
+
+class SingleFlight:
+    """
+    In-flight request coalescing for one event loop.
+    The first caller for a key (the leader) starts the computation as its own
+    task; callers that arrive with the same key while it is running await the
+    same task and get the same result object (treat it as read-only) or the
+    same exception. Every caller, the leader included, awaits it through
+    asyncio.shield, so a caller that goes away does not cancel the others.
+    Nothing is kept once the computation finishes, so this is not a cache.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight = {}
+        self.calls = 0
+        self.leaders = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) (a coroutine function), shared between identical keys."""
+        self.calls += 1
+        entry = self._inflight.get(key)
+        if entry is not None:
+            task, waiters = entry
+            waiters[0] += 1
+            self.max_waiters = max(self.max_waiters, waiters[0])
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = (task, [0])
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._inflight.get(key, (None,))[0] is task:
+            del self._inflight[key]
+        # every caller may have gone away; mark any exception as retrieved
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._inflight),
+            "max_waiters": self.max_waiters,
+        }
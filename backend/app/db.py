@@ -1,17 +1,95 @@
 # backend/app/db.py
 from sqlmodel import SQLModel, Session, create_engine
-from typing import Optional
+from sqlalchemy import insert, select, and_, or_
+from typing import Optional, List, Dict, Any
+from datetime import datetime
 import os
+import json
+import base64
 
 def get_engine(database_url: str):
     engine = create_engine(database_url, echo=False, connect_args={"check_same_thread": False} if database_url.startswith("sqlite") else {})
     return engine
 
 def create_db_and_tables(engine):
-    from .models import Patient, ConditionRecord, ConceptMapRecord, AuditEvent
+    from .models import Patient, ConditionRecord, ConceptMapRecord, AuditEvent, AuditRollup, CodingJob, CodingSuggestion
+    from .migrations import ensure_columns, ensure_indexes
     SQLModel.metadata.create_all(engine)
+    # bring databases created before newer columns / indexes were declared up to date
+    ensure_columns(engine)
+    ensure_indexes(engine)
 
 def init_db(database_url: str = "sqlite:///./data/namaste_app.db"):
     engine = get_engine(database_url)
     create_db_and_tables(engine)
     return engine
+
+def bulk_insert_conditions(session: Session, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Insert ConditionRecord rows with a single multi-row INSERT ... RETURNING id
+    (ids come back in row order). Does not commit: the caller owns the transaction.
+    """
+    from .models import ConditionRecord
+    if not rows:
+        return []
+    now = datetime.utcnow()
+    rows = [{"created_at": now, **r} for r in rows]
+    if session.bind.dialect.insert_executemany_returning_sort_by_parameter_order:
+        stmt = insert(ConditionRecord).returning(ConditionRecord.id, sort_by_parameter_order=True)
+        return list(session.scalars(stmt, rows))
+    # dialects without executemany RETURNING: let the ORM batch the inserts
+    objs = [ConditionRecord(**r) for r in rows]
+    session.add_all(objs)
+    session.flush()
+    return [o.id for o in objs]
+
+HISTORY_FIELDS = ("id", "created_at", "patient_reference", "namaste_code", "namaste_display",
+                  "icd_code", "icd_display", "provenance")
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def patient_history_stmt(patient_reference: str, after=None, order: str = "desc", fields=None,
+                         namaste_codes=None, icd_codes=None, limit: Optional[int] = None):
+    """
+    Keyset-paginated history query on (created_at, id), served from the
+    (patient_reference, created_at) index. `after` is a decoded cursor: rows
+    strictly past it in the requested order are returned. id and created_at are
+    always selected so the caller can build the next cursor.
+    """
+    from .models import ConditionRecord
+    names = list(fields or HISTORY_FIELDS)
+    for required in ("created_at", "id"):
+        if required not in names:
+            names.insert(0, required)
+    cols = [getattr(ConditionRecord, f) for f in names]
+    stmt = select(*cols).where(ConditionRecord.patient_reference == patient_reference)
+    if namaste_codes:
+        stmt = stmt.where(ConditionRecord.namaste_code.in_(namaste_codes))
+    if icd_codes:
+        stmt = stmt.where(ConditionRecord.icd_code.in_(icd_codes))
+    if after is not None:
+        created_at, row_id = after
+        if order == "asc":
+            stmt = stmt.where(or_(ConditionRecord.created_at > created_at,
+                                  and_(ConditionRecord.created_at == created_at, ConditionRecord.id > row_id)))
+        else:
+            stmt = stmt.where(or_(ConditionRecord.created_at < created_at,
+                                  and_(ConditionRecord.created_at == created_at, ConditionRecord.id < row_id)))
+    if order == "asc":
+        stmt = stmt.order_by(ConditionRecord.created_at.asc(), ConditionRecord.id.asc())
+    else:
+        stmt = stmt.order_by(ConditionRecord.created_at.desc(), ConditionRecord.id.desc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
@@ -1,246 +1,434 @@
 # backend/app/elevenlabs.py
-import requests
 import os
-import logging
-import base64
 import time
-import json
-from datetime import datetime
-from io import BytesIO
+import random
+import asyncio
+import logging
+import httpx
+
+from .archive import JsonlArchive
+from .metrics import stage, observe_stage
 
 # Set up logger
 logger = logging.getLogger("elevenlabs")
 
-try:
-    from elevenlabs import ElevenLabs
-    ELEVENLABS_SDK_AVAILABLE = True
-except ImportError:
-    ELEVENLABS_SDK_AVAILABLE = False
-    logger.warning("ElevenLabs SDK not available, falling back to direct API calls")
-
 # NOTE: ElevenLabs API implementation based on latest documentation
 # You must set ELEVEN_API_KEY in env.
+ELEVEN_API_BASE = os.environ.get("ELEVEN_API_BASE", "https://api.elevenlabs.io")
+ELEVEN_MAX_CONCURRENCY = int(os.environ.get("ELEVEN_MAX_CONCURRENCY", "8"))
+ELEVEN_MAX_CONNECTIONS = int(os.environ.get("ELEVEN_MAX_CONNECTIONS", "16"))
+# total time budget for one STT request, shared by all model fallbacks
+ELEVEN_STT_DEADLINE = float(os.environ.get("ELEVEN_STT_DEADLINE", "60"))
+ELEVEN_STT_MAX_RETRIES = int(os.environ.get("ELEVEN_STT_MAX_RETRIES", "2"))
+ELEVEN_RETRY_BASE_DELAY = float(os.environ.get("ELEVEN_RETRY_BASE_DELAY", "0.25"))
+ELEVEN_RETRY_MAX_DELAY = float(os.environ.get("ELEVEN_RETRY_MAX_DELAY", "4"))
+ELEVEN_BREAKER_FAILURES = int(os.environ.get("ELEVEN_BREAKER_FAILURES", "3"))
+ELEVEN_BREAKER_COOLDOWN = float(os.environ.get("ELEVEN_BREAKER_COOLDOWN", "30"))
+ELEVEN_TTS_TIMEOUT = float(os.environ.get("ELEVEN_TTS_TIMEOUT", "60"))
+
+DEFAULT_VOICE_ID = "JBFqnCBsd6RMkjVDRZzb"  # Default voice ID (verified working)
+TTS_MODEL_ID = "eleven_multilingual_v2"
+TTS_VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.5,
+    "style": 0.0,
+    "use_speaker_boost": True
+}
+TTS_OUTPUT_FORMAT = "mp3_44100_128"
+
+# Based on ElevenLabs STT documentation, the correct model ID is "scribe_v1"
+STT_MODEL_IDS = [
+    "scribe_v1",               # Correct STT model ID from documentation
+    "eleven_multilingual_v2",  # Fallback option
+    "eleven_multilingual_v1"   # Another fallback
+]
+# extra form fields per model (scribe_v1 gets the options the SDK call used to send)
+STT_MODEL_OPTIONS = {"scribe_v1": {"tag_audio_events": "true", "diarize": "true"}}
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
 
-def elevenlabs_stt(audio_bytes: bytes, api_key: str):
+
+# STT transcripts are appended to a compressed, rotating JSONL archive by a background writer
+STT_ARCHIVE_DIR = os.environ.get("STT_ARCHIVE_DIR", "STT")
+STT_ARCHIVE_SEGMENT_MB = int(os.environ.get("STT_ARCHIVE_SEGMENT_MB", "16"))
+STT_ARCHIVE_SEGMENT_AGE = float(os.environ.get("STT_ARCHIVE_SEGMENT_AGE", "3600"))
+STT_ARCHIVE_RETENTION_DAYS = float(os.environ.get("STT_ARCHIVE_RETENTION_DAYS", "30"))
+STT_ARCHIVE_MAX_MB = int(os.environ.get("STT_ARCHIVE_MAX_MB", "1024"))
+
+_transcript_archive = None
+
+def get_transcript_archive() -> JsonlArchive:
+    global _transcript_archive
+    if _transcript_archive is None:
+        _transcript_archive = JsonlArchive(
+            STT_ARCHIVE_DIR,
+            prefix="stt",
+            max_segment_bytes=STT_ARCHIVE_SEGMENT_MB * 1024 * 1024,
+            max_segment_age=STT_ARCHIVE_SEGMENT_AGE,
+            retention_days=STT_ARCHIVE_RETENTION_DAYS,
+            max_total_bytes=STT_ARCHIVE_MAX_MB * 1024 * 1024,
+        ).start()
+    return _transcript_archive
+
+def _archive_stt_result(stt_data: dict):
+    """Queue an STT result for the transcript archive (never blocks the request)"""
+    try:
+        get_transcript_archive().append(stt_data)
+    except Exception as save_error:
+        logger.warning(f"Failed to archive STT result: {save_error}")
+
+
+class CircuitBreaker:
     """
-    Send audio bytes to ElevenLabs STT API.
-    Returns a transcript string.
-    
-    Based on ElevenLabs Speech-to-Text API documentation:
-    https://elevenlabs.io/docs/api-reference/speech-to-text/get
+    Consecutive-failure circuit breaker.
+    After `failure_threshold` failures in a row the breaker opens and the
+    backend is skipped for `cooldown` seconds; then a single trial call is let
+    through (half-open) and its outcome closes or re-opens the breaker.
     """
-    if not api_key:
-        raise RuntimeError("ElevenLabs API key not set")
-    
-    try:
-        # Try using ElevenLabs SDK first if available
-        if ELEVENLABS_SDK_AVAILABLE:
+    def __init__(self, failure_threshold: int = ELEVEN_BREAKER_FAILURES, cooldown: float = ELEVEN_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a trial slot taken by allow() without recording an outcome."""
+        self._trial_in_flight = False
+
+
+class _RetryableError(Exception):
+    pass
+
+
+class _ClientError(RuntimeError):
+    """Non-retryable 4xx: the request was rejected (e.g. unusable audio), the backend is up."""
+    pass
+
+
+class _BudgetExhausted(RuntimeError):
+    pass
+
+
+def _backoff_delay(attempt: int) -> float:
+    # exponential backoff with full jitter
+    return random.uniform(0, min(ELEVEN_RETRY_MAX_DELAY, ELEVEN_RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def _extract_transcript(data):
+    if "text" in data:
+        return data["text"]
+    if "transcript" in data:
+        return data["transcript"]
+    logger.warning(f"Unexpected STT response format: {data}")
+    return str(data)
+
+
+class ElevenLabsClient:
+    """
+    Async ElevenLabs client.
+    Holds one pooled httpx.AsyncClient (keep-alive connections are reused across
+    calls) and caps the number of concurrent upstream requests.
+    """
+    def __init__(self, api_key: str, base_url: str = ELEVEN_API_BASE,
+                 max_concurrency: int = ELEVEN_MAX_CONCURRENCY, max_connections: int = ELEVEN_MAX_CONNECTIONS,
+                 stt_deadline: float = ELEVEN_STT_DEADLINE, tts_timeout: float = ELEVEN_TTS_TIMEOUT,
+                 stt_max_retries: int = ELEVEN_STT_MAX_RETRIES):
+        if not api_key:
+            raise RuntimeError("ElevenLabs API key not set")
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.stt_deadline = stt_deadline
+        self.stt_max_retries = stt_max_retries
+        self.tts_timeout = tts_timeout
+        self._http = None
+        self._sem = None
+        self._breakers = {}
+
+    def breaker(self, backend: str) -> CircuitBreaker:
+        if backend not in self._breakers:
+            self._breakers[backend] = CircuitBreaker()
+        return self._breakers[backend]
+
+    def breaker_states(self):
+        return {name: b.state for name, b in self._breakers.items()}
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"xi-api-key": self.api_key},
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections,
+                                    keepalive_expiry=60.0),
+                timeout=httpx.Timeout(self.tts_timeout, connect=10.0),
+            )
+        return self._http
+
+    def _limiter(self) -> asyncio.Semaphore:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self._sem
+
+    async def stt(self, audio_bytes: bytes, content_type: str = None, filename: str = "audio",
+                  archive: bool = True) -> str:
+        """
+        Send audio bytes to ElevenLabs STT API.
+        Returns a transcript string.
+
+        The whole request (all model fallbacks, including retries)
+        is bounded by `stt_deadline`; the remaining budget is split evenly over
+        the backends still to try. Backends whose circuit breaker is open are
+        skipped. archive=False keeps the result out of the transcript archive
+        (live-dictation partials).
+
+        Based on ElevenLabs Speech-to-Text API documentation:
+        https://elevenlabs.io/docs/api-reference/speech-to-text/get
+        """
+        try:
+            async with self._limiter():
+                with stage("elevenlabs_stt"):
+                    return await self._stt(audio_bytes, content_type, filename, archive)
+        except RuntimeError:
+            raise
+        except Exception as e:
+            logger.error(f"STT processing error: {e}")
+            raise RuntimeError(f"STT processing error: {e}")
+
+    async def _stt(self, audio_bytes: bytes, content_type: str, filename: str, archive: bool = True) -> str:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.stt_deadline
+        # every attempt goes through the pooled httpx client, so the deadline and
+        # max_concurrency bound the upstream work (a blocking SDK call in a thread can't be cancelled)
+        backends = [b for b in STT_MODEL_IDS if self.breaker(b).state != "open"]
+
+        last_error = None
+        for i, backend in enumerate(backends):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            breaker = self.breaker(backend)
+            # the half-open trial slot is taken only for the backend about to be called
+            if not breaker.allow():
+                continue
+            budget = remaining / (len(backends) - i)
+            outcome = None
             try:
-                logger.info("Using ElevenLabs SDK for STT...")
-                
-                # Initialize ElevenLabs client
-                client = ElevenLabs(api_key=api_key)
-                
-                # Convert audio bytes to BytesIO for SDK
-                audio_io = BytesIO(audio_bytes)
-                
-                # Use the SDK's speech_to_text.convert method
-                transcription = client.speech_to_text.convert(
-                    file=audio_io,
-                    model_id="scribe_v1",
-                    tag_audio_events=True,
-                    language_code="eng",
-                    diarize=True,
-                )
-                
-                # Extract transcript from SDK response
-                transcript = transcription.text if hasattr(transcription, 'text') else str(transcription)
-                
-                # Save STT result to JSON file for future reference
-                try:
-                    # Create STT directory if it doesn't exist
-                    stt_dir = "STT"
-                    os.makedirs(stt_dir, exist_ok=True)
-                    
-                    # Generate filename with timestamp
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"stt_result_{timestamp}.json"
-                    filepath = os.path.join(stt_dir, filename)
-                    
-                    # Prepare data for storage
-                    stt_data = {
-                        "timestamp": timestamp,
-                        "model_id": "scribe_v1",
-                        "audio_size_bytes": len(audio_bytes),
-                        "transcription_result": str(transcription),
-                        "extracted_text": transcript,
-                        "method": "sdk"
-                    }
-                    
-                    # Save to JSON file
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        json.dump(stt_data, f, indent=2, ensure_ascii=False)
-                    
-                    logger.info(f"STT result saved to: {filepath}")
-                    
-                except Exception as save_error:
-                    logger.warning(f"Failed to save STT result to JSON: {save_error}")
-                
-                logger.info(f"STT SDK success: {transcript}")
+                transcript = await self._stt_direct(backend, audio_bytes, content_type, filename,
+                                                    loop.time() + budget, archive)
+                outcome = "success"
                 return transcript
-                
-            except Exception as sdk_error:
-                logger.warning(f"ElevenLabs SDK failed: {sdk_error}, falling back to direct API")
-        
-        # Fallback to direct API calls if SDK fails or is not available
-        logger.info("Using direct API calls for STT...")
-        
-        # ElevenLabs STT API endpoint
-        upload_url = "https://api.elevenlabs.io/v1/speech-to-text"
-        headers = {"xi-api-key": api_key}
-        
-        # Convert audio bytes to base64
-        audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
-        
-        # Based on ElevenLabs STT documentation, the correct model ID is "scribe_v1"
-        model_ids_to_try = [
-            "scribe_v1",               # Correct STT model ID from documentation
-            "eleven_multilingual_v2",  # Fallback option
-            "eleven_multilingual_v1"   # Another fallback
-        ]
-        
-        for model_id in model_ids_to_try:
+            except _BudgetExhausted as e:
+                last_error = e
+                break
+            except Exception as e:
+                # a rejected request says nothing about the backend's health
+                if not isinstance(e, _ClientError):
+                    outcome = "failure"
+                last_error = e
+                logger.warning(f"STT backend {backend} failed: {e}")
+            finally:
+                # cancelled, out of budget or rejected: the slot is returned without an outcome
+                if outcome == "success":
+                    breaker.record_success()
+                elif outcome == "failure":
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+        if last_error is None:
+            raise RuntimeError("STT unavailable: all backends are cooling down after repeated failures")
+        raise RuntimeError(f"STT failed within {self.stt_deadline:.0f}s deadline: {last_error}")
+
+    async def _stt_direct(self, model_id: str, audio_bytes: bytes, content_type: str, filename: str,
+                          attempt_deadline: float, archive: bool = True) -> str:
+        """
+        Multipart upload of the raw audio to one model, retrying retryable
+        statuses / network errors with jittered backoff until attempt_deadline.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._client()
+        for attempt in range(self.stt_max_retries + 1):
+            timeout = attempt_deadline - loop.time()
+            if timeout <= 0:
+                raise _BudgetExhausted(f"STT budget exhausted for model {model_id}")
             try:
-                payload = {
-                    "audio": audio_base64,
+                logger.info(f"Uploading audio to ElevenLabs STT API with model {model_id} (attempt {attempt + 1})...")
+                # httpx timeouts are per network operation; wait_for bounds the whole call
+                resp = await asyncio.wait_for(client.post(
+                    "/v1/speech-to-text",
+                    files={"file": (filename or "audio", audio_bytes, content_type or "application/octet-stream")},
+                    data={"model_id": model_id, "language_code": "eng", **STT_MODEL_OPTIONS.get(model_id, {})},
+                    timeout=timeout,
+                ), timeout=timeout)
+                if resp.status_code in RETRYABLE_STATUS:
+                    raise _RetryableError(f"STT API error: {resp.status_code} - {resp.text}")
+                if 400 <= resp.status_code < 500:
+                    raise _ClientError(f"STT API error: {resp.status_code} - {resp.text}")
+                if resp.status_code != 200:
+                    raise RuntimeError(f"STT API error: {resp.status_code} - {resp.text}")
+            except (httpx.HTTPError, asyncio.TimeoutError, _RetryableError) as e:
+                delay = _backoff_delay(attempt)
+                if attempt == self.stt_max_retries or loop.time() + delay >= attempt_deadline:
+                    raise RuntimeError(f"STT error with model {model_id}: {e}")
+                logger.warning(f"Retryable STT error with model {model_id}: {e}; retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            data = resp.json()
+            logger.info(f"STT API success with model {model_id}: {data}")
+            transcript = _extract_transcript(data)
+            if archive:
+                _archive_stt_result({
                     "model_id": model_id,
-                    "language": "en"
-                }
-                
-                # Log the payload for debugging (without the large audio data)
-                debug_payload = payload.copy()
-                debug_payload["audio"] = f"<audio_data_{len(audio_base64)}_chars>"
-                logger.info(f"STT payload with model {model_id}: {debug_payload}")
-                
-                logger.info(f"Uploading audio to ElevenLabs STT API with model {model_id}...")
-                resp = requests.post(upload_url, headers=headers, json=payload, timeout=120)
-                
-                if resp.status_code == 200:
-                    data = resp.json()
-                    logger.info(f"STT API success with model {model_id}: {data}")
-                    
-                    # Save STT result to JSON file for future reference
-                    try:
-                        # Create STT directory if it doesn't exist
-                        stt_dir = "STT"
-                        os.makedirs(stt_dir, exist_ok=True)
-                        
-                        # Generate filename with timestamp
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        filename = f"stt_result_{timestamp}.json"
-                        filepath = os.path.join(stt_dir, filename)
-                        
-                        # Prepare data for storage
-                        stt_data = {
-                            "timestamp": timestamp,
-                            "model_id": model_id,
-                            "audio_size_bytes": len(audio_bytes),
-                            "transcription_result": data,
-                            "extracted_text": "",
-                            "method": "direct_api"
-                        }
-                        
-                        # Extract transcript and add to storage data
-                        if "text" in data:
-                            transcript = data["text"]
-                            stt_data["extracted_text"] = transcript
-                        elif "transcript" in data:
-                            transcript = data["transcript"]
-                            stt_data["extracted_text"] = transcript
-                        else:
-                            logger.warning(f"Unexpected STT response format: {data}")
-                            transcript = str(data)
-                            stt_data["extracted_text"] = transcript
-                        
-                        # Save to JSON file
-                        with open(filepath, 'w', encoding='utf-8') as f:
-                            json.dump(stt_data, f, indent=2, ensure_ascii=False)
-                        
-                        logger.info(f"STT result saved to: {filepath}")
-                        
-                    except Exception as save_error:
-                        logger.warning(f"Failed to save STT result to JSON: {save_error}")
-                    
-                    # Return the transcript
-                    if "text" in data:
-                        return data["text"]
-                    elif "transcript" in data:
-                        return data["transcript"]
-                    else:
-                        logger.warning(f"Unexpected STT response format: {data}")
-                        return str(data)
-                else:
-                    logger.warning(f"STT API error with model {model_id}: {resp.status_code} - {resp.text}")
-                    if model_id == model_ids_to_try[-1]:  # Last model to try
-                        raise RuntimeError(f"STT API error: {resp.status_code} - {resp.text}")
-                    continue  # Try next model
-                    
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"Network error with model {model_id}: {e}")
-                if model_id == model_ids_to_try[-1]:  # Last model to try
-                    raise RuntimeError(f"Network error in STT: {e}")
-                continue  # Try next model
-            
-    except Exception as e:
-        logger.error(f"STT processing error: {e}")
-        raise RuntimeError(f"STT processing error: {e}")
-
-def elevenlabs_tts(text: str, api_key: str, voice: str = None):
-    """
-    Request ElevenLabs TTS and return binary audio bytes.
-    
-    Based on ElevenLabs Text-to-Speech API documentation:
-    https://elevenlabs.io/docs/api-reference/text-to-speech/convert
-    """
-    if not api_key:
-        raise RuntimeError("ElevenLabs API key not set")
-    
-    try:
-        # Use a verified voice ID from ElevenLabs
-        # These are commonly available voice IDs
-        voice_id = voice or "JBFqnCBsd6RMkjVDRZzb"  # Default voice ID (verified working)
-        
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-        headers = {
-            "xi-api-key": api_key,
-            "Content-Type": "application/json"
-        }
-        
+                    "audio_size_bytes": len(audio_bytes),
+                    "transcription_result": data,
+                    "extracted_text": transcript,
+                    "method": "direct_api"
+                })
+            return transcript
+
+    async def tts(self, text: str, voice: str = None) -> bytes:
+        """
+        Request ElevenLabs TTS and return binary audio bytes.
+
+        Based on ElevenLabs Text-to-Speech API documentation:
+        https://elevenlabs.io/docs/api-reference/text-to-speech/convert
+        """
+        voice_id = voice or DEFAULT_VOICE_ID
         payload = {
             "text": text,
-            "model_id": "eleven_multilingual_v2",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5,
-                "style": 0.0,
-                "use_speaker_boost": True
-            },
-            "output_format": "mp3_44100_128"
+            "model_id": TTS_MODEL_ID,
+            "voice_settings": TTS_VOICE_SETTINGS,
+            "output_format": TTS_OUTPUT_FORMAT
         }
-        
-        logger.info(f"Requesting TTS for text: {text[:50]}...")
-        resp = requests.post(url, headers=headers, json=payload, timeout=120)
-        
+        try:
+            logger.info(f"Requesting TTS for text: {text[:50]}...")
+            async with self._limiter():
+                with stage("elevenlabs_tts"):
+                    resp = await self._client().post(f"/v1/text-to-speech/{voice_id}", json=payload, timeout=self.tts_timeout)
+        except httpx.HTTPError as e:
+            logger.error(f"Network error in TTS: {e}")
+            raise RuntimeError(f"Network error in TTS: {e}")
+
         if resp.status_code != 200:
             logger.error(f"TTS API error: {resp.status_code} - {resp.text}")
             raise RuntimeError(f"TTS API error: {resp.status_code} - {resp.text}")
-        
+
         logger.info(f"TTS API success, received {len(resp.content)} bytes")
         return resp.content  # binary audio bytes
-        
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Network error in TTS: {e}")
-        raise RuntimeError(f"Network error in TTS: {e}")
-    except Exception as e:
-        logger.error(f"TTS processing error: {e}")
-        raise RuntimeError(f"TTS processing error: {e}")
+
+    async def tts_stream(self, text: str, voice: str = None, chunk_size: int = 16384):
+        """
+        Stream ElevenLabs TTS audio, yielding chunks as they arrive from upstream.
+        """
+        voice_id = voice or DEFAULT_VOICE_ID
+        payload = {
+            "text": text,
+            "model_id": TTS_MODEL_ID,
+            "voice_settings": TTS_VOICE_SETTINGS,
+            "output_format": TTS_OUTPUT_FORMAT
+        }
+        logger.info(f"Requesting streamed TTS for text: {text[:50]}...")
+        try:
+            async with self._limiter():
+                # observed when upstream starts answering (time to first byte), not per streamed chunk
+                started = time.perf_counter()
+                async with self._client().stream("POST", f"/v1/text-to-speech/{voice_id}/stream",
+                                                 json=payload, timeout=self.tts_timeout) as resp:
+                    observe_stage("elevenlabs_tts_stream", time.perf_counter() - started)
+                    if resp.status_code != 200:
+                        body = (await resp.aread()).decode("utf-8", "replace")
+                        logger.error(f"TTS API error: {resp.status_code} - {body}")
+                        raise RuntimeError(f"TTS API error: {resp.status_code} - {body}")
+                    async for chunk in resp.aiter_bytes(chunk_size):
+                        yield chunk
+        except httpx.HTTPError as e:
+            logger.error(f"Network error in TTS: {e}")
+            raise RuntimeError(f"Network error in TTS: {e}")
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+# One shared client per API key, used by the FastAPI app
+_clients = {}
+
+def get_client(api_key: str) -> ElevenLabsClient:
+    client = _clients.get(api_key)
+    if client is None:
+        client = _clients[api_key] = ElevenLabsClient(api_key)
+    return client
+
+async def close_clients():
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
+
+async def elevenlabs_stt_async(audio_bytes: bytes, api_key: str, content_type: str = None, filename: str = "audio") -> str:
+    return await get_client(api_key).stt(audio_bytes, content_type=content_type, filename=filename)
+
+async def elevenlabs_tts_async(text: str, api_key: str, voice: str = None) -> bytes:
+    return await get_client(api_key).tts(text, voice=voice)
+
+def elevenlabs_tts_stream(text: str, api_key: str, voice: str = None):
+    return get_client(api_key).tts_stream(text, voice=voice)
+
+
+# Sync wrappers for scripts / CLI (must not be called from a running event loop)
+async def _oneshot(method: str, api_key: str, *args, **kwargs):
+    client = ElevenLabsClient(api_key)
+    try:
+        return await getattr(client, method)(*args, **kwargs)
+    finally:
+        await client.aclose()
+
+def elevenlabs_stt(audio_bytes: bytes, api_key: str) -> str:
+    """
+    Blocking STT call. Returns a transcript string.
+    """
+    if not api_key:
+        raise RuntimeError("ElevenLabs API key not set")
+    try:
+        return asyncio.run(_oneshot("stt", api_key, audio_bytes))
+    finally:
+        # short-lived scripts may exit right after this call
+        get_transcript_archive().flush()
+
+def elevenlabs_tts(text: str, api_key: str, voice: str = None) -> bytes:
+    """
+    Blocking TTS call. Returns binary audio bytes.
+    """
+    if not api_key:
+        raise RuntimeError("ElevenLabs API key not set")
+    return asyncio.run(_oneshot("tts", api_key, text, voice=voice))
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Embedding sidecar: one process owns the model and serves every API worker
+over a Unix domain socket.
+
+Usage (from backend/):
+  python -m app.embed_sidecar --socket /tmp/intellicure-embed.sock
+
+Requests from all connections go into one queue; a single batcher collects up
+to --max-batch texts (waiting at most --max-wait-ms after the first one) and
+encodes them in one forward pass, so concurrent workers share batches.
+
+Wire format (all integers unsigned, big-endian):
+  request:  op u8 | length u32 | payload
+  response: status u8 | length u32 | payload     (status 0 = ok, 1 = error)
+  EMBED  payload: count u32, then per text: length u32 + UTF-8 bytes
+         reply:   count u32 | dim u32 | count*dim float32 (little-endian)
+  HEALTH / STATS reply: UTF-8 JSON
+"""
+import os
+import json
+import time
+import queue
+import struct
+import signal
+import socket
+import asyncio
+import argparse
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger("embed_sidecar")
+
+OP_EMBED = 1
+OP_HEALTH = 2
+OP_STATS = 3
+STATUS_OK = 0
+STATUS_ERROR = 1
+HEADER = struct.Struct("!BI")
+U32 = struct.Struct("!I")
+MAX_FRAME = 64 * 1024 * 1024
+
+
+def encode_texts(texts) -> bytes:
+    parts = [U32.pack(len(texts))]
+    for t in texts:
+        data = t.encode("utf-8")
+        parts.append(U32.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_texts(payload: bytes):
+    (count,) = U32.unpack_from(payload, 0)
+    pos = U32.size
+    texts = []
+    for _ in range(count):
+        (n,) = U32.unpack_from(payload, pos)
+        pos += U32.size
+        texts.append(payload[pos:pos + n].decode("utf-8"))
+        pos += n
+    return texts
+
+
+def encode_vectors(vecs: np.ndarray) -> bytes:
+    vecs = np.ascontiguousarray(vecs, dtype="<f4")
+    return struct.pack("!II", vecs.shape[0], vecs.shape[1]) + vecs.tobytes()
+
+
+def decode_vectors(payload: bytes) -> np.ndarray:
+    count, dim = struct.unpack_from("!II", payload, 0)
+    return np.frombuffer(payload, dtype="<f4", offset=8, count=count * dim).reshape(count, dim).astype("float32")
+
+
+# ---------------------------------------------------------------- client
+
+class SidecarError(RuntimeError):
+    pass
+
+
+class SidecarClient:
+    """
+    Blocking client with a small pool of persistent connections (safe to use
+    from the executor threads that call EmbeddingService.embed()).
+    """
+    def __init__(self, path: str, timeout: float = 10.0, pool_size: int = 8):
+        self.path = path
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+    @staticmethod
+    def _recv_exact(sock, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = sock.recv(min(n - len(buf), 1 << 20))
+            if not chunk:
+                raise ConnectionError("sidecar closed the connection")
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def request(self, op: int, payload: bytes = b"") -> bytes:
+        for attempt in (1, 2):
+            try:
+                sock = self._pool.get_nowait()
+            except queue.Empty:
+                sock = None
+            try:
+                if sock is None:
+                    sock = self._connect()
+                sock.sendall(HEADER.pack(op, len(payload)) + payload)
+                status, length = HEADER.unpack(self._recv_exact(sock, HEADER.size))
+                body = self._recv_exact(sock, length)
+            except OSError as e:
+                if sock is not None:
+                    sock.close()
+                # a pooled connection may have gone stale (sidecar restart): retry once on a fresh one
+                if attempt == 2:
+                    raise SidecarError(f"embedding sidecar unavailable at {self.path}: {e}")
+                continue
+            try:
+                self._pool.put_nowait(sock)
+            except queue.Full:
+                sock.close()
+            if status != STATUS_OK:
+                raise SidecarError(body.decode("utf-8", "replace"))
+            return body
+
+    def embed(self, texts) -> np.ndarray:
+        return decode_vectors(self.request(OP_EMBED, encode_texts(list(texts))))
+
+    def health(self) -> dict:
+        return json.loads(self.request(OP_HEALTH))
+
+    def stats(self) -> dict:
+        return json.loads(self.request(OP_STATS))
+
+
+# ---------------------------------------------------------------- server
+
+class SidecarServer:
+    def __init__(self, embed_service, path: str, max_batch: int = 64, max_wait_ms: float = 5.0):
+        self.embed_service = embed_service
+        self.path = path
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._model_lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.errors = 0
+        self.started = time.time()
+
+    def queue_depth(self) -> int:
+        """Texts waiting to be encoded."""
+        return sum(len(texts) for texts, _ in list(self._queue._queue)) if self._queue else 0
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "connections": self.connections,
+            "requests": self.requests,
+            "texts": self.texts,
+            "batches": self.batches,
+            "avg_batch_texts": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "errors": self.errors,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+    def health(self) -> dict:
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "model_loaded": self.embed_service.model_loaded,
+            "model_dir": self.embed_service.model_dir,
+            "dim": self.embed_service.dim,
+            "uptime_s": round(time.time() - self.started, 1),
+            "queue_depth": self.queue_depth(),
+        }
+
+    def _encode(self, texts):
+        with self._model_lock:
+            return self.embed_service.embed(texts)
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            n = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while n < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                n += len(item[0])
+            texts = [t for item, _ in batch for t in item]
+            try:
+                vecs = await asyncio.to_thread(self._encode, texts)
+            except Exception as e:
+                self.errors += 1
+                logger.exception("Batch encode failed")
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            pos = 0
+            for item, fut in batch:
+                if not fut.done():
+                    fut.set_result(vecs[pos:pos + len(item)])
+                pos += len(item)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    op, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+                except asyncio.IncompleteReadError:
+                    return
+                if length > MAX_FRAME:
+                    writer.write(HEADER.pack(STATUS_ERROR, 14) + b"frame too big.")
+                    await writer.drain()
+                    return
+                payload = await reader.readexactly(length)
+                self.requests += 1
+                try:
+                    if op == OP_EMBED:
+                        texts = decode_texts(payload)
+                        if texts:
+                            fut = asyncio.get_running_loop().create_future()
+                            await self._queue.put((texts, fut))
+                            body = encode_vectors(await fut)
+                        else:
+                            body = encode_vectors(np.zeros((0, self.embed_service.dim), dtype="float32"))
+                    elif op == OP_HEALTH:
+                        body = json.dumps(self.health()).encode("utf-8")
+                    elif op == OP_STATS:
+                        body = json.dumps(self.stats()).encode("utf-8")
+                    else:
+                        raise ValueError(f"unknown op {op}")
+                    writer.write(HEADER.pack(STATUS_OK, len(body)) + body)
+                except Exception as e:
+                    msg = str(e).encode("utf-8")
+                    writer.write(HEADER.pack(STATUS_ERROR, len(msg)) + msg)
+                await writer.drain()
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def serve(self):
+        self._queue = asyncio.Queue()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        batcher = asyncio.create_task(self._batcher())
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        logger.info(f"Embedding sidecar listening on {self.path} (model_loaded={self.embed_service.model_loaded})")
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            batcher.cancel()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--socket", default=os.environ.get("EMBEDDING_SIDECAR_SOCKET", "/tmp/intellicure-embed.sock"))
+    p.add_argument("--model_dir", default=os.environ.get("FINETUNED_MODEL_DIR", "./models/gemma_finetuned"))
+    p.add_argument("--max-batch", type=int, default=int(os.environ.get("EMBEDDING_SIDECAR_MAX_BATCH", "64")))
+    p.add_argument("--max-wait-ms", type=float, default=float(os.environ.get("EMBEDDING_SIDECAR_MAX_WAIT_MS", "5")))
+    p.add_argument("--threads", type=int, default=int(os.environ.get("TORCH_NUM_THREADS", "0")))
+    return p.parse_args()
+
+
+def main():
+    from .ml_utils import EmbeddingService
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    svc = EmbeddingService(model_dir=args.model_dir, num_threads=args.threads)
+    svc.freeze_for_inference()
+    server = SidecarServer(svc, args.socket, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    asyncio.run(server.serve())
+    logger.info("Embedding sidecar stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# backend/app/executor.py
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import observe_stage
+
+logger = logging.getLogger("executor")
+
+
+class ExecutorOverloaded(RuntimeError):
+    """
+    Raised when a task is rejected by admission control.
+    status_code is 429 when the queue is full and 503 when the expected
+    (or actual) queue wait exceeds the deadline.
+    """
+    def __init__(self, message: str, status_code: int = 503, retry_after: float = 1.0):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """
+    Dedicated thread pool for CPU-heavy model / index work.
+    Keeps embedding and FAISS calls out of Starlette's shared threadpool, caps
+    how many run at once and sheds load instead of letting the queue grow.
+    """
+    def __init__(self, max_workers: int = 2, max_queue: int = 64, max_wait_ms: float = 500.0, name: str = "cpu"):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        # exponentially weighted average of task run time, used to predict queue wait
+        self._avg_service = 0.0
+        self._completed = 0
+        self._rejected_full = 0
+        self._rejected_deadline = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._last_wait = 0.0
+
+    def _estimated_wait(self) -> float:
+        # tasks ahead of us, spread over the workers
+        ahead = self._queued + self._running - self.max_workers + 1
+        if ahead <= 0:
+            return 0.0
+        return ahead * self._avg_service / self.max_workers
+
+    def _retry_after(self) -> float:
+        return max(1.0, round(self._estimated_wait() or self._avg_service or 1.0))
+
+    def _admit(self):
+        with self._lock:
+            if self._queued >= self.max_queue and self._running >= self.max_workers:
+                self._rejected_full += 1
+                raise ExecutorOverloaded(f"{self.name} executor queue full", status_code=429, retry_after=self._retry_after())
+            if self._estimated_wait() > self.max_wait:
+                self._rejected_deadline += 1
+                raise ExecutorOverloaded(f"{self.name} executor queue wait exceeds deadline", status_code=503, retry_after=self._retry_after())
+            self._queued += 1
+
+    def _wrap(self, fn, args, kwargs, enqueued_at):
+        def task():
+            started = time.perf_counter()
+            wait = started - enqueued_at
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._last_wait = wait
+            observe_stage("queue_wait", wait)
+            try:
+                # drop work whose caller has already waited past the deadline
+                if wait > self.max_wait:
+                    with self._lock:
+                        self._rejected_deadline += 1
+                    raise ExecutorOverloaded(f"{self.name} executor queue wait exceeded deadline", status_code=503, retry_after=self._retry_after())
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._avg_service = elapsed if self._completed == 1 else 0.8 * self._avg_service + 0.2 * elapsed
+        return task
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the pool and await the result.
+        Raises ExecutorOverloaded if the task is not admitted.
+        """
+        self._admit()
+        task = self._wrap(fn, args, kwargs, time.perf_counter())
+        ctx = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, ctx.run, task)
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Blocking run() for background threads outside the event loop.
+        Raises ExecutorOverloaded if the task is not admitted.
+        """
+        self._admit()
+        task = self._wrap(fn, args, kwargs, time.perf_counter())
+        ctx = contextvars.copy_context()
+        return self._pool.submit(ctx.run, task).result()
+
+    def stats(self):
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "rejected_queue_full": self._rejected_full,
+                "rejected_deadline": self._rejected_deadline,
+                "avg_service_ms": self._avg_service * 1000.0,
+                "avg_wait_ms": (self._wait_total / started * 1000.0) if started else 0.0,
+                "max_wait_seen_ms": self._wait_max * 1000.0,
+                "last_wait_ms": self._last_wait * 1000.0,
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait)
@@ -1,15 +1,24 @@
 # backend/app/faiss_utils.py
 import os
+import re
+import time
+import bisect
 import numpy as np
-import pandas as pd
-import faiss
 import logging
+from collections import defaultdict
 from difflib import get_close_matches
 
+from .metrics import stage
+
 logger = logging.getLogger("faiss_utils")
 
 class FaissService:
-    def __init__(self, index_path="./data/faiss_icd_hnsw.idx", meta_path="./data/icd_meta.npy", icd_csv="./data/icd_corpus.csv"):
+    """
+    FAISS index over the ICD corpus. faiss and pandas are imported on load(),
+    so constructing with load=False is cheap (the app loads it in its lifespan).
+    """
+    def __init__(self, index_path="./data/faiss_icd_hnsw.idx", meta_path="./data/icd_meta.npy", icd_csv="./data/icd_corpus.csv",
+                 load: bool = True):
         self.index_path = index_path
         self.meta_path = meta_path
         self.icd_csv = icd_csv
@@ -18,27 +27,49 @@ class FaissService:
         self.icd_list = []
         self.index_loaded = False
         self.n_items = 0
+        self.lexical = None
+        self.index_version = None
+        self.load_seconds = None
+        if load:
+            self.load()
+
+    def load(self):
+        if self.load_seconds is not None:
+            # already loaded (e.g. by the preloading master before fork)
+            return self.index_loaded
+        start = time.perf_counter()
         self._try_load()
+        self.load_seconds = round(time.perf_counter() - start, 3)
+        return self.index_loaded
 
     def _try_load(self):
         if os.path.exists(self.index_path) and os.path.exists(self.meta_path):
             try:
                 logger.info(f"Loading FAISS index from {self.index_path}")
-                self.index = faiss.read_index(self.index_path)
+                import faiss
+                index = faiss.read_index(self.index_path)
                 self.meta = np.load(self.meta_path, allow_pickle=True)
                 self.n_items = len(self.meta)
+                self.index = index
                 self.index_loaded = True
+                # lexical candidates must be available even when the index is (e.g. degraded search)
+                self.icd_list = [str(m[1]) for m in self.meta]
+                self.lexical = LexicalIndex(self.meta)
+                self.index_version = f"faiss:{int(os.path.getmtime(self.index_path))}:{self.n_items}"
                 logger.info(f"FAISS index loaded with {self.n_items} items")
             except Exception as e:
                 logger.exception("Failed to load FAISS index")
                 self.index_loaded = False
-        else:
+        if not self.index_loaded:
             # try load icd_csv as fallback corpus for fuzzy search
             self.load_icd_corpus()
 
     def load_icd_corpus(self):
         if os.path.exists(self.icd_csv):
+            import pandas as pd
             df = pd.read_csv(self.icd_csv, encoding='utf-8')
+            # same column naming as ml/build_faiss_index.py accepts
+            df = df.rename(columns={'icd11_code': 'icd_code', 'icd11_term': 'icd_term', 'icd11_description': 'icd_description'})
             self.icd_list = df['icd_term'].astype(str).fillna("").tolist()
             # also store meta array shape
             try:
@@ -46,6 +77,9 @@ class FaissService:
                 for i, row in df.iterrows():
                     self.meta[i] = (row.get('icd_code', ''), row.get('icd_term', ''), row.get('icd_description', ''))
                 self.n_items = len(df)
+                self.lexical = LexicalIndex(self.meta)
+                if not self.index_loaded:
+                    self.index_version = f"csv:{int(os.path.getmtime(self.icd_csv))}:{self.n_items}"
                 logger.info(f"Loaded ICD corpus CSV with {self.n_items} rows")
             except Exception:
                 logger.exception("failed to build meta from icd csv")
@@ -68,24 +102,99 @@ class FaissService:
         """
         Embed the text using the provided embed_service and query index.
         """
+        return self.search_batch_with_embedding([text], embed_service, k=k)[0]
+
+    def search_batch_with_embedding(self, texts, embed_service, k=5):
+        """
+        Embed all texts in one forward pass and query the index once for the whole batch.
+        Returns one candidate list per input text.
+        """
         if not self.index_loaded:
             raise RuntimeError("Index not loaded")
-        vec = embed_service.embed([text]).astype('float32')
+        if not texts:
+            return []
+        vecs = embed_service.embed(list(texts)).astype('float32')
         # tune efSearch at query time if HNSW
         try:
             if hasattr(self.index, 'hnsw'):
                 self.index.hnsw.efSearch = 128
         except Exception:
             pass
-        D, I = self.index.search(vec, k)
+        with stage("faiss_search"):
+            D, I = self.index.search(vecs, k)
+        with stage("metadata_lookup"):
+            return [self._candidates(D[row], I[row]) for row in range(len(texts))]
+
+    def _candidates(self, dists, ids):
         results = []
-        for dist, idx in zip(D[0], I[0]):
+        for dist, idx in zip(dists, ids):
             if idx < 0:
                 continue
             meta = self.meta[idx]
             results.append({"icd_code": meta['icd_code'], "icd_term": meta['icd_term'], "icd_description": meta['icd_description'], "score": float(dist)})
         return results
 
+    def lexical_search(self, text, k=5):
+        """Token/prefix match over ICD terms; cheap enough to run next to every semantic search."""
+        if self.lexical is None:
+            return fallback_search_icd(text, self.icd_list, k=k)
+        with stage("lexical_search"):
+            return self.lexical.search(text, k=k)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def _tokens(text):
+    return _TOKEN_RE.findall(str(text).lower())
+
+class LexicalIndex:
+    """
+    Inverted index from lowercase term tokens to ICD rows. Every query token must
+    match a token exactly, except the last one, which may be a prefix (typeahead).
+    rows: sequence of (icd_code, icd_term, icd_description).
+    """
+    def __init__(self, rows, max_prefix_expansions=64):
+        self.rows = rows
+        self.max_prefix_expansions = max_prefix_expansions
+        postings = defaultdict(list)
+        for i, row in enumerate(rows):
+            for tok in set(_tokens(row[1])):
+                postings[tok].append(i)
+        self.postings = {tok: np.asarray(ids, dtype=np.int32) for tok, ids in postings.items()}
+        self.vocab = sorted(self.postings)
+        self.term_len = np.asarray([len(str(row[1])) for row in rows], dtype=np.int32)
+
+    def _prefixed(self, prefix):
+        lo = bisect.bisect_left(self.vocab, prefix)
+        out = []
+        for tok in self.vocab[lo:lo + self.max_prefix_expansions]:
+            if not tok.startswith(prefix):
+                break
+            out.append(tok)
+        return out
+
+    def search(self, query, k=5):
+        toks = _tokens(query)
+        if not toks or not len(self.rows):
+            return []
+        scores = np.zeros(len(self.rows), dtype=np.float32)
+        for j, tok in enumerate(toks):
+            weight = np.zeros(len(self.rows), dtype=np.float32)
+            if j == len(toks) - 1:
+                for other in self._prefixed(tok):
+                    weight[self.postings[other]] = 0.8
+            exact = self.postings.get(tok)
+            if exact is not None:
+                weight[exact] = 1.0
+            scores += weight
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        # best coverage first, then the shortest (most specific) term
+        order = np.lexsort((self.term_len[hits], -scores[hits]))[:k]
+        return [{"icd_code": str(self.rows[i][0]), "icd_term": str(self.rows[i][1]),
+                 "icd_description": str(self.rows[i][2]), "score": round(float(scores[i]) / len(toks), 3)}
+                for i in hits[order]]
+
 def fallback_search_icd(query, corpus_list, k=5):
     """
     Very simple fallback: use difflib.get_close_matches on corpus_list
@@ -93,7 +202,8 @@ def fallback_search_icd(query, corpus_list, k=5):
     """
     if not corpus_list:
         return []
-    matches = get_close_matches(query, corpus_list, n=k, cutoff=0.3)
+    with stage("fallback_search"):
+        matches = get_close_matches(query, corpus_list, n=k, cutoff=0.3)
     results = []
     for m in matches:
         # approximate score by similarity of sequences (simple)
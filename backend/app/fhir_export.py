@@ -0,0 +1,48 @@
+# backend/app/fhir_export.py
+import json
+import zlib
+import logging
+from datetime import datetime
+
+from sqlmodel import Session, select
+
+from .models import ConditionRecord, ConceptMapRecord
+from .fhir_utils import condition_resource, conceptmap_resource
+
+logger = logging.getLogger("fhir_export")
+
+EXPORT_TYPES = {
+    "Condition": (ConditionRecord, condition_resource),
+    "ConceptMap": (ConceptMapRecord, conceptmap_resource),
+}
+
+
+def iter_export_ndjson(engine, types, since: datetime = None, batch_size: int = 1000):
+    """
+    Yield NDJSON lines (bytes) for every exported resource, type by type, in id order.
+    Rows are fetched with a server-side cursor in batches of `batch_size` and
+    released as soon as they are written, so memory does not grow with the table.
+    """
+    with Session(engine) as session:
+        for rtype in types:
+            model, to_resource = EXPORT_TYPES[rtype]
+            stmt = select(model)
+            if since is not None:
+                stmt = stmt.where(model.created_at >= since)
+            stmt = stmt.order_by(model.id).execution_options(yield_per=batch_size)
+            count = 0
+            for partition in session.exec(stmt).partitions():
+                lines = [json.dumps(to_resource(rec), separators=(",", ":")) + "\n" for rec in partition]
+                count += len(lines)
+                yield "".join(lines).encode("utf-8")
+            logger.info(f"Exported {count} {rtype} resources")
+
+
+def gzip_stream(chunks, level: int = 6):
+    """Compress an iterator of byte chunks into a single gzip stream."""
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
@@ -0,0 +1,91 @@
+# backend/app/fhir_stream.py
+import json
+import logging
+
+logger = logging.getLogger("fhir_stream")
+
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+NDJSON_TYPES = ("application/x-ndjson", "application/fhir+ndjson", "application/ndjson")
+
+
+class EntryError(Exception):
+    """An entry that could not be decoded; the stream itself can continue."""
+
+
+class _ChunkReader:
+    """Adapts an async iterator of byte chunks to the async read() interface ijson expects."""
+    def __init__(self, chunks):
+        self._chunks = chunks.__aiter__()
+        self._buf = b""
+        self._eof = False
+
+    async def read(self, n: int = -1) -> bytes:
+        while not self._eof and (n < 0 or len(self._buf) < n):
+            try:
+                self._buf += await self._chunks.__anext__()
+            except StopAsyncIteration:
+                self._eof = True
+        if n < 0:
+            data, self._buf = self._buf, b""
+        else:
+            data, self._buf = self._buf[:n], self._buf[n:]
+        return data
+
+
+def _unwrap(item):
+    # accept both bare resources and Bundle.entry objects ({"fullUrl":..., "resource": {...}})
+    if isinstance(item, dict) and "resource" in item and "resourceType" not in item:
+        return item["resource"]
+    return item
+
+
+async def iter_ndjson(chunks, max_line_bytes: int = 8 * 1024 * 1024):
+    """
+    Yield one resource per NDJSON line. Lines that are not valid JSON are
+    yielded as EntryError instances so the caller can record them and go on.
+    """
+    buf = b""
+    async for chunk in chunks:
+        buf += chunk
+        while True:
+            nl = buf.find(b"\n")
+            if nl < 0:
+                break
+            line, buf = buf[:nl], buf[nl + 1:]
+            if line.strip():
+                yield _decode_line(line)
+        if len(buf) > max_line_bytes:
+            raise ValueError(f"NDJSON line longer than {max_line_bytes} bytes")
+    if buf.strip():
+        yield _decode_line(buf)
+
+
+def _decode_line(line: bytes):
+    try:
+        return _unwrap(json.loads(line))
+    except ValueError as e:
+        return EntryError(f"invalid JSON: {e}")
+
+
+async def iter_bundle_entries(chunks):
+    """
+    Yield the resources of a JSON Bundle's `entry` array one at a time,
+    without materialising the whole document.
+    """
+    if not IJSON_AVAILABLE:
+        raise RuntimeError("ijson is required for streaming JSON bundles (use NDJSON or install ijson)")
+    async for entry in ijson.items_async(_ChunkReader(chunks), "entry.item", use_float=True):
+        yield _unwrap(entry)
+
+
+def iter_resources(content_type: str, chunks):
+    """Pick the NDJSON or Bundle JSON parser from the request content type."""
+    media = (content_type or "").split(";")[0].strip().lower()
+    if media in NDJSON_TYPES:
+        return iter_ndjson(chunks)
+    return iter_bundle_entries(chunks)
@@ -1,31 +1,197 @@
 # backend/app/fhir_utils.py
+from functools import lru_cache
+
+# Strict validation builds the full fhir.resources model of each resource.
 try:
-    from fhir.resources.bundle import Bundle
-    from fhir.resources.fhirabstractbase import FHIRValidationError
-    FHIR_AVAILABLE = True
+    from fhir.resources import get_fhir_model_class
 except ImportError:
-    # Fallback if FHIR resources not available
-    FHIR_AVAILABLE = False
-    Bundle = None
-    FHIRValidationError = Exception
-
-def validate_fhir_bundle(bundle_json: dict) -> bool:
-    """
-    Validate basic FHIR bundle structure using fhir.resources.
-    Raises FHIRValidationError if invalid.
-    """
-    if not FHIR_AVAILABLE:
-        # Basic validation without FHIR library
-        if not isinstance(bundle_json, dict):
-            raise ValueError("Bundle must be a dictionary")
-        if "resourceType" not in bundle_json:
-            raise ValueError("Bundle must have resourceType")
-        if bundle_json.get("resourceType") != "Bundle":
-            raise ValueError("resourceType must be 'Bundle'")
-        return True
-    
+    get_fhir_model_class = None
+
+VALIDATION_LEVELS = ("fast", "strict")
+STRICT_AVAILABLE = get_fhir_model_class is not None
+
+# Fast validation only checks the elements we read and persist. Specs map an
+# element name to a type, a nested spec (object) or a one-item list (array of).
+# Elements may be absent but not null (FHIR JSON has no null values).
+_CODING = {"system": str, "version": str, "code": str, "display": str}
+_CODEABLE_CONCEPT = {"coding": [_CODING], "text": str}
+_REFERENCE = {"reference": str, "display": str}
+_RESOURCE_SPECS = {
+    "Condition": {
+        "required": ("subject",),
+        "elements": {"id": str, "subject": _REFERENCE, "code": _CODEABLE_CONCEPT,
+                     "clinicalStatus": _CODEABLE_CONCEPT, "recordedDate": str, "onsetDateTime": str},
+    },
+    "Patient": {
+        "elements": {"id": str, "identifier": [{"system": str, "value": str}], "name": [{"text": str}]},
+    },
+}
+_GENERIC_SPEC = {"elements": {"id": str}}
+
+def _compile(spec, path: str):
+    if isinstance(spec, type):
+        def check(value):
+            if not isinstance(value, spec):
+                raise ValueError(f"{path} must be {spec.__name__}")
+        return check
+    if isinstance(spec, list):
+        item = _compile(spec[0], path + "[]")
+        def check(value):
+            if not isinstance(value, list):
+                raise ValueError(f"{path} must be an array")
+            for v in value:
+                item(v)
+        return check
+    fields = [(name, _compile(sub, f"{path}.{name}")) for name, sub in spec.items()]
+    def check(value):
+        if not isinstance(value, dict):
+            raise ValueError(f"{path} must be an object")
+        for name, field_check in fields:
+            if name not in value:
+                continue
+            v = value[name]
+            if v is None:
+                raise ValueError(f"{path}.{name} must not be null")
+            field_check(v)
+    return check
+
+@lru_cache(maxsize=None)
+def resource_validator(rtype: str):
+    """Compile (once per resourceType) the fast validator for a resource type."""
+    spec = _RESOURCE_SPECS.get(rtype, _GENERIC_SPEC)
+    required = spec.get("required", ())
+    body = _compile(spec["elements"], rtype)
+    def validate(res: dict):
+        for name in required:
+            if name not in res:
+                raise ValueError(f"{rtype}.{name} is required")
+        body(res)
+    return validate
+
+@lru_cache(maxsize=None)
+def _model_class(rtype: str):
     try:
-        b = Bundle.parse_obj(bundle_json)
-        return True
-    except FHIRValidationError as e:
-        raise e
+        return get_fhir_model_class(rtype)
+    except (KeyError, ValueError):
+        raise ValueError(f"Unknown resourceType: {rtype}")
+
+def _validate_model(res: dict, rtype: str):
+    if not STRICT_AVAILABLE:
+        raise RuntimeError("strict validation requires fhir.resources")
+    cls = _model_class(rtype)
+    try:
+        parse = getattr(cls, "model_validate", None) or cls.parse_obj
+        parse(res)
+    except Exception as e:
+        raise ValueError(str(e))
+
+def validate_resource(res: dict, level: str = "fast"):
+    """
+    Validate a single resource and extract what we persist from it.
+    Returns (resourceType, row) where row holds the ConditionRecord column values
+    for Conditions and is None otherwise; raises ValueError if the resource is invalid.
+    """
+    if not isinstance(res, dict):
+        raise ValueError("Entry must be a JSON object")
+    rtype = res.get("resourceType")
+    if not isinstance(rtype, str) or not rtype:
+        raise ValueError("Resource must have resourceType")
+    resource_validator(rtype)(res)
+    if level == "strict":
+        _validate_model(res, rtype)
+    elif level != "fast":
+        raise ValueError(f"Unknown validation level: {level}")
+    return rtype, condition_row(res) if rtype == "Condition" else None
+
+def validate_bundle(bundle_json: dict, level: str = "fast") -> dict:
+    """
+    Validate a Bundle and collect its Condition rows in a single pass.
+    Raises ValueError naming the first invalid entry.
+    """
+    if not isinstance(bundle_json, dict):
+        raise ValueError("Bundle must be a dictionary")
+    if bundle_json.get("resourceType") != "Bundle":
+        raise ValueError("resourceType must be 'Bundle'")
+    entries = bundle_json.get("entry") or []
+    if not isinstance(entries, list):
+        raise ValueError("Bundle.entry must be an array")
+    rows = []
+    for i, e in enumerate(entries):
+        if not isinstance(e, dict):
+            raise ValueError(f"entry[{i}]: must be an object")
+        try:
+            _, row = validate_resource(e.get("resource"), level)
+        except ValueError as err:
+            raise ValueError(f"entry[{i}]: {err}")
+        if row is not None:
+            rows.append(row)
+    return {"entries": len(entries), "conditions": rows}
+
+def condition_row(res: dict) -> dict:
+    """
+    Map a FHIR Condition resource to ConditionRecord column values (dual coding).
+    """
+    codings = (res.get("code") or {}).get("coding") or []
+    namaste = None; icd = None
+    for c in codings:
+        sys = (c.get("system") or "").lower()
+        if "namaste" in sys:
+            namaste = c
+        if "icd" in sys or "who" in sys:
+            icd = c
+    return {
+        "patient_reference": (res.get("subject") or {}).get("reference"),
+        "namaste_code": namaste.get("code") if namaste else None,
+        "namaste_display": namaste.get("display") if namaste else None,
+        "icd_code": icd.get("code") if icd else None,
+        "icd_display": icd.get("display") if icd else None,
+    }
+
+NAMASTE_SYSTEM = "http://namaste.ayush.gov.in/codes"
+ICD11_SYSTEM = "http://hl7.org/fhir/sid/icd-11"
+
+def _instant(dt) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z" if dt else None
+
+def condition_resource(rec) -> dict:
+    """
+    Build a FHIR Condition (NAMASTE + ICD-11 dual coding) from a ConditionRecord.
+    """
+    coding = []
+    if rec.namaste_code:
+        coding.append({"system": NAMASTE_SYSTEM, "code": rec.namaste_code, "display": rec.namaste_display})
+    if rec.icd_code:
+        coding.append({"system": ICD11_SYSTEM, "code": rec.icd_code, "display": rec.icd_display})
+    res = {
+        "resourceType": "Condition",
+        "id": str(rec.id),
+        "meta": {"lastUpdated": _instant(rec.created_at)},
+        "subject": {"reference": rec.patient_reference},
+        "code": {"coding": [{k: v for k, v in c.items() if v is not None} for c in coding]},
+        "recordedDate": _instant(rec.created_at),
+    }
+    if rec.provenance:
+        res["note"] = [{"text": rec.provenance}]
+    return res
+
+def conceptmap_resource(rec) -> dict:
+    """
+    Build a single-element FHIR ConceptMap from a ConceptMapRecord.
+    """
+    target = {"code": rec.target_code, "equivalence": rec.equivalence or "equivalent"}
+    if rec.confidence is not None:
+        target["comment"] = f"confidence={rec.confidence:.3f}"
+    res = {
+        "resourceType": "ConceptMap",
+        "id": f"cm-{rec.id}",
+        "meta": {"lastUpdated": _instant(rec.created_at)},
+        "status": "active",
+        "group": [{
+            "source": rec.source_system,
+            "target": rec.target_system,
+            "element": [{"code": rec.source_code, "target": [target]}],
+        }],
+    }
+    if rec.curator:
+        res["publisher"] = rec.curator
+    return res
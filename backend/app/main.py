@@ -2,28 +2,74 @@
 import os
 import json
 import time
+import hmac
 import base64
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from typing import Optional, List, Dict, Any
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect, Request, Query, Depends
+from fastapi.responses import Response, StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from sqlmodel import Session, select
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
-from .db import init_db, get_engine, create_db_and_tables
-from .models import Patient, ConditionRecord, ConceptMapRecord, AuditEvent
+from .db import (
+    init_db, get_engine, create_db_and_tables, bulk_insert_conditions,
+    HISTORY_FIELDS, encode_cursor, decode_cursor, patient_history_stmt,
+)
+from .models import Patient, ConditionRecord, ConceptMapRecord, CodingJob, CodingSuggestion
 from .ml_utils import EmbeddingService
+from .embed_sidecar import SidecarError
 from .faiss_utils import FaissService, fallback_search_icd
-from .elevenlabs import elevenlabs_stt, elevenlabs_tts
-from .fhir_utils import validate_fhir_bundle
+from .elevenlabs import (
+    elevenlabs_stt_async, elevenlabs_tts_async, elevenlabs_tts_stream, close_clients, get_client,
+    get_transcript_archive,
+    DEFAULT_VOICE_ID, TTS_MODEL_ID, TTS_VOICE_SETTINGS, TTS_OUTPUT_FORMAT,
+)
+from .tts_cache import TTSCache
+from .fhir_utils import validate_bundle, validate_resource, VALIDATION_LEVELS, STRICT_AVAILABLE
+from .fhir_stream import iter_resources, EntryError
+from .fhir_export import EXPORT_TYPES, iter_export_ndjson, gzip_stream
+from .nlp_utils import extract_clinical_phrases, FragmentTracker
+from .streaming_stt import make_streaming_provider
+from .cache_utils import LRUCache
+from .executor import BoundedExecutor, ExecutorOverloaded
+from .migrations import check_index_usage
+from .audit import AuditWriter
+from .autocoding import AutoCoder, enqueue_coding_jobs
+from .readiness import ComponentRegistry, PROCESS_STARTED
+from .procinfo import memory_report
+from .coalesce import SingleFlight
+from .metrics import REGISTRY, Gauge, MetricsMiddleware, stage
+from .tracing import Tracer, TracingMiddleware, annotate
+from .profiler import profile_process, ProfilerBusy
+from .querylog import QueryLog, QueryCaptureMiddleware
+from .archive import JsonlArchive, parse_time, parse_utc
 from fastapi.middleware.cors import CORSMiddleware
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("backend")
 
-app = FastAPI(title="IntelliCure - NAMASTE Terminology Microservice")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the database is needed by every endpoint, so the port opens after it is ready;
+    # model / index loading continues in the background and /admin/ready reports it
+    if not schema_prepared:
+        await asyncio.to_thread(prepare_database)
+    await asyncio.to_thread(tts_cache.load)
+    audit_writer.start()
+    slow_request_archive.start()
+    query_log.start()
+    loader = asyncio.create_task(asyncio.to_thread(load_services))
+    yield
+    await shutdown_services()
+    if not loader.done():
+        logger.info("Shutting down while services are still loading")
+
+app = FastAPI(title="IntelliCure - NAMASTE Terminology Microservice", lifespan=lifespan)
 
 # CORS - allow frontend dev origin(s)
 app.add_middleware(
@@ -33,6 +79,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# per-route request counts / latency for /metrics
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(SidecarError)
+async def sidecar_unavailable(request: Request, exc: SidecarError):
+    # EMBEDDING_MODE=sidecar has no dummy fallback: the embedding could not be computed
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
 
 # Initialize DB and services
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./data/namaste_app.db")
@@ -41,18 +94,155 @@ FAISS_INDEX_PATH = os.environ.get("FAISS_INDEX_PATH", "./data/faiss_icd_hnsw.idx
 FAISS_META_PATH = os.environ.get("FAISS_META_PATH", "./data/icd_meta.npy")
 ICD_CORPUS_CSV = os.environ.get("ICD_CORPUS_CSV", "./data/icd_corpus.csv")
 ELEVEN_KEY = os.environ.get("ELEVEN_API_KEY", "")
+# dedicated executor for embedding / FAISS work
+CPU_EXECUTOR_WORKERS = int(os.environ.get("CPU_EXECUTOR_WORKERS", "2"))
+CPU_EXECUTOR_QUEUE = int(os.environ.get("CPU_EXECUTOR_QUEUE", "64"))
+CPU_EXECUTOR_MAX_WAIT_MS = float(os.environ.get("CPU_EXECUTOR_MAX_WAIT_MS", "500"))
+TORCH_NUM_THREADS = int(os.environ.get("TORCH_NUM_THREADS", "0"))
+STREAMING_STT_PROVIDER = os.environ.get("STREAMING_STT_PROVIDER", "elevenlabs")  # "stub" for offline development
+FRAGMENT_CACHE_SIZE = int(os.environ.get("FRAGMENT_CACHE_SIZE", "4096"))
+AUDIT_BLOB_DIR = os.environ.get("AUDIT_BLOB_DIR", "./data/audit_blobs")
+AUDIT_INLINE_MAX_BYTES = int(os.environ.get("AUDIT_INLINE_MAX_BYTES", "2048"))
+AUDIT_RETENTION_DAYS = float(os.environ.get("AUDIT_RETENTION_DAYS", "90"))
+AUDIT_SUBMIT_TIMEOUT = float(os.environ.get("AUDIT_SUBMIT_TIMEOUT", "2"))  # wait for queue room before dropping
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "./data/tts_cache")
+TTS_CACHE_MAX_MB = int(os.environ.get("TTS_CACHE_MAX_MB", "256"))
+FHIR_VALIDATION_LEVEL = os.environ.get("FHIR_VALIDATION_LEVEL", "fast")
+STREAM_INGEST_BATCH = int(os.environ.get("STREAM_INGEST_BATCH", "500"))
+STREAM_INGEST_MAX_ERRORS = int(os.environ.get("STREAM_INGEST_MAX_ERRORS", "1000"))
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "100"))
+HISTORY_MAX_PAGE_SIZE = int(os.environ.get("HISTORY_MAX_PAGE_SIZE", "1000"))
+AUTOCODE_ENABLED = os.environ.get("AUTOCODE_ENABLED", "1") == "1"
+AUTOCODE_BATCH = int(os.environ.get("AUTOCODE_BATCH", "64"))
+AUTOCODE_TOP_K = int(os.environ.get("AUTOCODE_TOP_K", "5"))
+AUTOCODE_POLL_INTERVAL = float(os.environ.get("AUTOCODE_POLL_INTERVAL", "5"))
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "1") == "1"
+SEARCH_BUDGET_MS = float(os.environ.get("SEARCH_BUDGET_MS", "150"))
+SEARCH_BUDGET_MAX_MS = float(os.environ.get("SEARCH_BUDGET_MAX_MS", "5000"))
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "4096"))
+EMBEDDING_MODE = os.environ.get("EMBEDDING_MODE", "inprocess")  # inprocess | sidecar
+EMBEDDING_SIDECAR_SOCKET = os.environ.get("EMBEDDING_SIDECAR_SOCKET", "/tmp/intellicure-embed.sock")
+TRACE_SERVER_TIMING = os.environ.get("TRACE_SERVER_TIMING", "0") == "1"
+SLOW_REQUEST_LOG = os.environ.get("SLOW_REQUEST_LOG", "0") == "1"
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "1000"))
+SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get("SLOW_REQUEST_SAMPLE_RATE", "1.0"))
+SLOW_REQUEST_LOG_DIR = os.environ.get("SLOW_REQUEST_LOG_DIR", "./data/slow_requests")
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")  # X-Admin-Token for profiling / payload / transcript endpoints; unset disables them
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+QUERY_CAPTURE = os.environ.get("QUERY_CAPTURE", "0") == "1"
+QUERY_CAPTURE_DIR = os.environ.get("QUERY_CAPTURE_DIR", "./data/query_log")
+QUERY_CAPTURE_SALT = os.environ.get("QUERY_CAPTURE_SALT", "")
+QUERY_CAPTURE_MAX_BODY_KB = int(os.environ.get("QUERY_CAPTURE_MAX_BODY_KB", "1024"))
 
 # Log configuration for debugging
 logger.info(f"Database URL: {DATABASE_URL}")
 logger.info(f"Model directory: {MODEL_DIR}")
 logger.info(f"ElevenLabs API key configured: {bool(ELEVEN_KEY)}")
 
+# nothing here connects or loads models: that happens in lifespan() / load_services()
 engine = get_engine(DATABASE_URL)
-create_db_and_tables(engine)
+components = ComponentRegistry(required=("database",))
+components.register("database", "embedding_model", "faiss_index")
 
-# instantiate ML / FAISS wrappers (these will try to load model/index if present)
-embed_svc = EmbeddingService(model_dir=MODEL_DIR)
-faiss_svc = FaissService(index_path=FAISS_INDEX_PATH, meta_path=FAISS_META_PATH, icd_csv=ICD_CORPUS_CSV)
+# ML / FAISS wrappers; handlers fall back (dummy embeddings / fuzzy search) until loaded
+embed_svc = EmbeddingService(model_dir=MODEL_DIR, num_threads=TORCH_NUM_THREADS, load=False,
+                             mode=EMBEDDING_MODE, sidecar_socket=EMBEDDING_SIDECAR_SOCKET)
+faiss_svc = FaissService(index_path=FAISS_INDEX_PATH, meta_path=FAISS_META_PATH, icd_csv=ICD_CORPUS_CSV, load=False)
+tts_cache = TTSCache(cache_dir=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_MB * 1024 * 1024, load=False)
+audit_writer = AuditWriter(engine, blob_dir=AUDIT_BLOB_DIR, inline_max_bytes=AUDIT_INLINE_MAX_BYTES,
+                           retention_days=AUDIT_RETENTION_DAYS, submit_timeout=AUDIT_SUBMIT_TIMEOUT)
+fragment_cache = LRUCache(maxsize=FRAGMENT_CACHE_SIZE)  # live-dictation suggestions by fragment
+search_cache = LRUCache(maxsize=SEARCH_CACHE_SIZE)  # semantic /api/search/icd results by (text, k)
+cpu_executor = BoundedExecutor(
+    max_workers=CPU_EXECUTOR_WORKERS,
+    max_queue=CPU_EXECUTOR_QUEUE,
+    max_wait_ms=CPU_EXECUTOR_MAX_WAIT_MS,
+    name="cpu",
+)
+# Server-Timing header and sampled slow-request log, switched at runtime via /admin/tracing
+slow_request_archive = JsonlArchive(SLOW_REQUEST_LOG_DIR, prefix="slow")
+tracer = Tracer(server_timing=TRACE_SERVER_TIMING, slow_log=SLOW_REQUEST_LOG, slow_ms=SLOW_REQUEST_MS,
+                sample_rate=SLOW_REQUEST_SAMPLE_RATE, archive=slow_request_archive)
+app.add_middleware(TracingMiddleware, tracer=tracer)
+# anonymised capture of search / embed / tts / ingest requests for scripts/replay_queries.py
+query_log = QueryLog(QUERY_CAPTURE_DIR, salt=QUERY_CAPTURE_SALT or None,
+                     max_body_bytes=QUERY_CAPTURE_MAX_BODY_KB * 1024, enabled=QUERY_CAPTURE)
+app.add_middleware(QueryCaptureMiddleware, log=query_log)
+# background coding of Conditions ingested with only one side of the dual code
+autocoder = AutoCoder(engine, faiss_svc, embed_svc, namaste_lookup=lambda codes: namaste_for_icd_codes(codes),
+                      batch_size=AUTOCODE_BATCH, k=AUTOCODE_TOP_K, poll_interval=AUTOCODE_POLL_INTERVAL,
+                      executor=cpu_executor)
+# identical concurrent embed / search calls share one computation
+embed_flight = SingleFlight("embed")
+search_flight = SingleFlight("search")
+if STARTUP_WARMUP:
+    components.register("warmup")
+# loaded, but serving dummy embeddings / fuzzy search: reported as degraded
+components.check("embedding_model", lambda: embed_svc.model_loaded)
+components.check("faiss_index", lambda: faiss_svc.index_loaded)
+
+schema_prepared = False
+
+def prepare_database():
+    """
+    Create tables and apply column / index migrations. app.server runs this once
+    in the master before forking, so workers don't race each other's DDL.
+    """
+    global schema_prepared
+    components.run("database", create_db_and_tables, engine)
+    schema_prepared = True
+
+def warm_up():
+    """One dummy encode + search so the first real request doesn't pay first-call costs."""
+    if faiss_svc.index_loaded:
+        faiss_svc.search_batch_with_embedding(["warm up"], embed_svc, k=1)
+    else:
+        embed_svc.embed(["warm up"])
+
+def load_services():
+    """Runs in a background thread after the port is open."""
+    components.run("embedding_model", embed_svc.load)
+    components.run("faiss_index", faiss_svc.load)
+    if STARTUP_WARMUP:
+        components.run("warmup", warm_up)
+    if AUTOCODE_ENABLED:
+        # run_once() only claims jobs while the model and index are loaded, so suggestions
+        # never come from the fallback; a sidecar that comes up later is picked up on the next poll
+        if not autocoder.ready():
+            logger.warning("Auto-coding waiting for the embedding model / FAISS index; jobs stay pending until then")
+        autocoder.start()
+
+def overloaded_response(e: ExecutorOverloaded):
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": str(int(e.retry_after))},
+    )
+
+async def shutdown_services():
+    cpu_executor.shutdown(wait=False)
+    await close_clients()
+    await asyncio.to_thread(get_transcript_archive().close)
+    await asyncio.to_thread(slow_request_archive.close)
+    await asyncio.to_thread(query_log.close)
+    await asyncio.to_thread(audit_writer.close)
+    await asyncio.to_thread(autocoder.close)
+
+# Readiness: 503 until the startup components have finished loading
+@app.get("/admin/ready")
+def ready():
+    is_ready = components.is_ready()
+    body = {
+        "ready": is_ready,
+        "uptime_s": round(time.time() - PROCESS_STARTED, 3),
+        "components": components.snapshot(),
+        "model_loaded": embed_svc.model_loaded,
+        "faiss_loaded": faiss_svc.index_loaded,
+    }
+    if not is_ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
 
 # Simple ping
 @app.get("/admin/status")
@@ -62,9 +252,115 @@ def status():
         "model_loaded": embed_svc.model_loaded,
         "faiss_loaded": faiss_svc.index_loaded,
         "icd_count": faiss_svc.n_items,
+        "embedding": embed_svc.health(),
+        "coalescing": {"embed": embed_flight.stats(), "search": search_flight.stats()},
+        "cpu_executor": cpu_executor.stats(),
+        "tts_cache": tts_cache.stats(),
+        "fragment_cache": fragment_cache.stats(),
+        "search_cache": search_cache.stats(),
+        "search_degraded": search_degraded,
+        "tracing": tracer.stats(),
+        "audit_writer": audit_writer.stats(),
+        "autocoder": autocoder.stats(),
+        "elevenlabs_breakers": get_client(ELEVEN_KEY).breaker_states() if ELEVEN_KEY else {},
+        # per-process memory; under app.server also the master and every worker (Pss totals)
+        "memory": memory_report(int(os.environ.get("SERVER_MASTER_PID", "0")) or None),
         "time": time.time()
     }
 
+# Prometheus gauges, evaluated on scrape
+REGISTRY.register(Gauge("intellicure_cache_entries", "Entries per in-process cache.",
+                        lambda: {("search",): search_cache.stats()["size"],
+                                 ("fragment",): fragment_cache.stats()["size"],
+                                 ("tts",): tts_cache.stats()["entries"]}, ("cache",)))
+REGISTRY.register(Gauge("intellicure_tts_cache_bytes", "Bytes stored in the TTS audio cache.",
+                        lambda: tts_cache.stats()["bytes"]))
+REGISTRY.register(Gauge("intellicure_executor_tasks", "CPU executor tasks by state.",
+                        lambda: {("queued",): cpu_executor.stats()["queue_depth"],
+                                 ("running",): cpu_executor.stats()["running"]}, ("state",)))
+REGISTRY.register(Gauge("intellicure_icd_index_items", "Items in the loaded ICD index / corpus.",
+                        lambda: faiss_svc.n_items))
+REGISTRY.register(Gauge("intellicure_audit_queue_depth", "Audit events waiting to be written.",
+                        lambda: audit_writer.stats()["pending"]))
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition (values are per worker process under app.server)."""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def require_admin_token(request: Request):
+    """Dependency for admin endpoints that expose patient data or change server behaviour."""
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="ADMIN_TOKEN is not configured")
+    if not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="invalid admin token")
+
+class TracingSettings(BaseModel):
+    server_timing: Optional[bool] = None
+    slow_log: Optional[bool] = None
+    slow_ms: Optional[float] = None
+    sample_rate: Optional[float] = None
+
+@app.get("/admin/tracing")
+def admin_tracing():
+    return tracer.stats()
+
+@app.post("/admin/tracing")
+def admin_tracing_update(settings: TracingSettings):
+    """Switch the Server-Timing header / slow-request log on or off (this worker process only)."""
+    try:
+        return tracer.configure(**settings.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/tracing/slow")
+async def admin_tracing_slow(start: Optional[str] = None, end: Optional[str] = None, limit: int = 100):
+    try:
+        start_ts, end_ts = parse_time(start), parse_time(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be epoch seconds or ISO-8601")
+    records = await asyncio.to_thread(slow_request_archive.query, start_ts, end_ts, limit)
+    return {"count": len(records), "records": records, "archive": slow_request_archive.stats()}
+
+class CaptureSettings(BaseModel):
+    enabled: bool
+
+@app.get("/admin/querylog")
+def admin_querylog():
+    return query_log.stats()
+
+@app.post("/admin/querylog", dependencies=[Depends(require_admin_token)])
+def admin_querylog_update(settings: CaptureSettings):
+    """Start / stop capturing replayable requests (this worker process only)."""
+    query_log.enabled = settings.enabled
+    logger.info(f"Query capture {'enabled' if settings.enabled else 'disabled'}")
+    return query_log.stats()
+
+@app.post("/admin/profile", dependencies=[Depends(require_admin_token)])
+async def admin_profile(seconds: float = 10.0, interval_ms: float = 5.0, top: int = 30,
+                        app_only: bool = True, torch: bool = False, format: str = "json"):
+    """
+    Sample the stacks of this worker for `seconds` while it keeps serving traffic.
+    format=collapsed returns the flamegraph input as text; json adds a top-N table
+    and (torch=true) the op table of model forward passes seen during the window.
+    """
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]")
+    if format not in ("json", "collapsed"):
+        raise HTTPException(status_code=400, detail="format must be json or collapsed")
+    if torch and (embed_svc.sidecar is not None or not embed_svc.model_loaded):
+        raise HTTPException(status_code=400, detail="torch profiling needs the model loaded in this process")
+    try:
+        result = await asyncio.to_thread(profile_process, seconds, max(interval_ms, 1.0) / 1000.0,
+                                         app_only=app_only, embed_service=embed_svc, torch_forward=torch, top=top)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "collapsed":
+        return Response(content=result["collapsed"], media_type="text/plain",
+                        headers={"X-Profile-Samples": str(result["samples"]), "X-Profile-Pid": str(result["pid"])})
+    return result
+
 # Enhanced login endpoint with role support
 @app.post("/api/login")
 def login(user: Dict[str, str]):
@@ -113,7 +409,8 @@ async def stt(file: UploadFile = File(...)):
         contents = await file.read()
         logger.info(f"Processing audio file: {file.filename}, size: {len(contents)} bytes")
         
-        transcript = elevenlabs_stt(audio_bytes=contents, api_key=ELEVEN_KEY)
+        transcript = await elevenlabs_stt_async(audio_bytes=contents, api_key=ELEVEN_KEY,
+                                               content_type=file.content_type, filename=file.filename)
         logger.info(f"STT successful: {transcript}")
         
         return {"transcript": transcript}
@@ -121,33 +418,92 @@ async def stt(file: UploadFile = File(...)):
         logger.exception("STT failed")
         raise HTTPException(status_code=500, detail=f"STT failed: {str(e)}")
 
+# Query the STT transcript archive by time range (epoch seconds or ISO-8601)
+@app.get("/admin/transcripts", dependencies=[Depends(require_admin_token)])
+async def admin_transcripts(start: Optional[str] = None, end: Optional[str] = None, limit: int = 100):
+    archive = get_transcript_archive()
+    try:
+        start_ts, end_ts = parse_time(start), parse_time(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be epoch seconds or ISO-8601")
+    records = await asyncio.to_thread(archive.query, start_ts, end_ts, limit)
+    return {"count": len(records), "records": records, "archive": archive.stats()}
+
 # TTS endpoint - returns audio bytes
 class TTSRequest(BaseModel):
     text: str
     voice: Optional[str] = None
+    stream: bool = False  # return audio/mpeg directly instead of base64 JSON
+
+def tts_cache_key(req: TTSRequest) -> str:
+    return tts_cache.make_key(req.text, req.voice or DEFAULT_VOICE_ID, TTS_MODEL_ID, TTS_VOICE_SETTINGS, TTS_OUTPUT_FORMAT)
+
+async def stream_tts_and_cache(req: TTSRequest, key: str):
+    """
+    Forward upstream chunks to the client while writing them to the cache.
+    The first chunk is awaited before responding so upstream errors still map to a 500.
+    """
+    chunks = elevenlabs_tts_stream(text=req.text, api_key=ELEVEN_KEY, voice=req.voice)
+    writer = tts_cache.writer(key)
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except Exception:
+        writer.abort()
+        raise
+    writer.write(first)
+
+    async def body():
+        completed = False
+        try:
+            yield first
+            async for chunk in chunks:
+                writer.write(chunk)
+                yield chunk
+            completed = True
+        finally:
+            if completed:
+                writer.commit()
+            else:
+                writer.abort()
+                await chunks.aclose()
+
+    return StreamingResponse(body(), media_type="audio/mpeg", headers={"X-TTS-Cache": "miss"})
 
 @app.post("/api/tts")
-def tts(req: TTSRequest):
+async def tts(req: TTSRequest):
     """
     Text-to-Speech endpoint using ElevenLabs API.
-    Accepts text and returns base64-encoded audio.
+    Accepts text and returns base64-encoded audio, or an audio/mpeg stream when
+    `stream` is set. Repeated phrases are served from the local TTS cache.
     """
-    if not ELEVEN_KEY:
-        raise HTTPException(status_code=500, detail="ElevenLabs API key not configured")
-    
     if not req.text or not req.text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
+
+    key = tts_cache_key(req)
+    cached = await asyncio.to_thread(tts_cache.read, key)
+    if cached is not None:
+        if req.stream:
+            return Response(content=cached, media_type="audio/mpeg", headers={"X-TTS-Cache": "hit"})
+        return {"audio_base64": base64.b64encode(cached).decode('utf-8'), "cached": True}
+
+    if not ELEVEN_KEY:
+        raise HTTPException(status_code=500, detail="ElevenLabs API key not configured")
     
     try:
         logger.info(f"Processing TTS request: {req.text[:50]}...")
+        if req.stream:
+            return await stream_tts_and_cache(req, key)
         
-        audio_bytes = elevenlabs_tts(text=req.text, api_key=ELEVEN_KEY, voice=req.voice)
+        audio_bytes = await elevenlabs_tts_async(text=req.text, api_key=ELEVEN_KEY, voice=req.voice)
         logger.info(f"TTS successful, generated {len(audio_bytes)} bytes")
+        await asyncio.to_thread(tts_cache.put, key, audio_bytes)
         
         # Convert to base64 for JSON response
         audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
         
-        return {"audio_base64": audio_base64}
+        return {"audio_base64": audio_base64, "cached": False}
     except Exception as e:
         logger.exception("TTS failed")
         raise HTTPException(status_code=500, detail=f"TTS failed: {str(e)}")
@@ -156,74 +512,469 @@ def tts(req: TTSRequest):
 class TextIn(BaseModel):
     text: str
 
+async def embed_texts(texts):
+    """embed_svc.embed on the CPU executor, coalesced with identical in-flight calls."""
+    texts = list(texts)
+    return await embed_flight.do(tuple(texts), cpu_executor.run, embed_svc.embed, texts)
+
+async def search_texts(texts, k):
+    """One embedding + FAISS pass for all texts, coalesced with identical in-flight calls."""
+    texts = list(texts)
+    return await search_flight.do((tuple(texts), k), cpu_executor.run,
+                                  faiss_svc.search_batch_with_embedding, texts, embed_svc, k=k)
+
 @app.post("/api/embed")
-def embed_text(inp: TextIn):
-    vec = embed_svc.embed([inp.text])[0]
+async def embed_text(inp: TextIn):
+    try:
+        vec = (await embed_texts([inp.text]))[0]
+    except ExecutorOverloaded as e:
+        raise overloaded_response(e)
     return {"vector": vec.tolist(), "dim": len(vec)}
 
 # ICD search endpoint (uses FAISS if available, otherwise fallback)
 class SearchIn(BaseModel):
     text: str
     k: Optional[int] = 5
+    budget_ms: Optional[float] = None  # latency budget; also X-Search-Budget-Ms, default SEARCH_BUDGET_MS
+
+search_degraded = {"timeout": 0, "overloaded": 0, "error": 0}
+
+def search_budget(inp: SearchIn, request: Request) -> float:
+    budget = inp.budget_ms
+    if budget is None:
+        header = request.headers.get("x-search-budget-ms")
+        try:
+            budget = float(header) if header else SEARCH_BUDGET_MS
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Search-Budget-Ms must be a number")
+    return max(1.0, min(budget, SEARCH_BUDGET_MAX_MS)) / 1000.0
+
+def _finish_in_background(task, key):
+    # the semantic search keeps running after a degraded response; keep its result for the next caller
+    def done(t):
+        if t.cancelled() or t.exception() is not None:
+            return
+        search_cache.put(key, t.result()[0])
+    task.add_done_callback(done)
+
+def fallback_search(text, k):
+    """
+    Search without the model. The lexical index answers exact tokens / typeahead
+    prefixes; misspellings it cannot match ("gastrits") go to the difflib matcher.
+    Returns (source, candidates) with source "lexical" or "fuzzy".
+    """
+    results = faiss_svc.lexical_search(text, k)
+    if results:
+        return "lexical", results
+    return "fuzzy", fallback_search_icd(text, faiss_svc.icd_list, k=k)
+
+def normalise_query(text: str) -> str:
+    """Collapse whitespace; the result is the cache key, the coalescing key and the embedding input."""
+    return " ".join(text.split())
 
 @app.post("/api/search/icd")
-def search_icd(inp: SearchIn):
-    # try to use FAISS with embedding service
-    if faiss_svc.index_loaded and embed_svc.model_loaded:
-        results = faiss_svc.search_text_with_embedding(inp.text, embed_svc, k=inp.k)
-        return {"source": "faiss", "candidates": results}
+async def search_icd(inp: SearchIn, request: Request):
+    text = normalise_query(inp.text)
+    annotate(query=text, k=inp.k, index_version=faiss_svc.index_version)
+    if not (faiss_svc.index_loaded and embed_svc.model_loaded):
+        # no model: token/prefix search, then difflib for misspellings, off the event loop
+        source, results = await asyncio.to_thread(fallback_search, text, inp.k)
+        return {"source": source, "candidates": results}
+
+    key = (text, inp.k)
+    cached = search_cache.get(key)
+    if cached is not None:
+        annotate(cached=True)
+        return {"source": "faiss", "candidates": cached, "cached": True}
+
+    budget = search_budget(inp, request)
+    # semantic and lexical search start together; lexical is the answer if semantic misses the budget
+    semantic = asyncio.ensure_future(search_texts([text], inp.k))
+    lexical = asyncio.ensure_future(asyncio.to_thread(faiss_svc.lexical_search, text, inp.k))
+    done, _ = await asyncio.wait({semantic}, timeout=budget)
+    reason = None
+    if semantic in done:
+        try:
+            results = semantic.result()[0]
+            search_cache.put(key, results)
+            return {"source": "faiss", "candidates": results}
+        except ExecutorOverloaded:
+            reason = "overloaded"
+        except Exception:
+            logger.exception("Semantic search failed; returning lexical results")
+            reason = "error"
     else:
-        # fallback: use text fuzzy search over ICD corpus
-        results = fallback_search_icd(inp.text, faiss_svc.icd_list, k=inp.k)
-        return {"source": "fuzzy", "candidates": results}
+        reason = "timeout"
+        _finish_in_background(semantic, key)
+    search_degraded[reason] += 1
+    annotate(degraded=reason)
+    return {"source": "degraded", "reason": reason, "candidates": await lexical,
+            "budget_ms": round(budget * 1000.0, 1)}
+
+def namaste_for_icd_codes(icd_codes):
+    """
+    Look up NAMASTE codes mapped to the given ICD codes (one query for all codes).
+    Returns {icd_code: [{"namaste_code", "equivalence", "confidence"}, ...]}
+    """
+    mapped = {}
+    icd_codes = [c for c in icd_codes if c]
+    if not icd_codes:
+        return mapped
+    with stage("namaste_lookup"), Session(engine) as session:
+        stmt = select(ConceptMapRecord).where(ConceptMapRecord.target_code.in_(icd_codes))
+        for cm in session.exec(stmt):
+            if "namaste" not in (cm.source_system or "").lower():
+                continue
+            mapped.setdefault(cm.target_code, []).append(
+                {"namaste_code": cm.source_code, "equivalence": cm.equivalence, "confidence": cm.confidence})
+    for maps in mapped.values():
+        maps.sort(key=lambda m: m["confidence"] or 0.0, reverse=True)
+    return mapped
+
+async def search_phrases(phrases, k=3):
+    """
+    Batched ICD search for several phrases: one embedding + FAISS pass, or fallback_search off the event loop.
+    Returns (source, [candidates per phrase]). May raise ExecutorOverloaded.
+    """
+    if not phrases:
+        return "none", []
+    if faiss_svc.index_loaded and embed_svc.model_loaded:
+        results = await search_texts(phrases, k)
+        # results may be shared with coalesced callers; copy before attach_namaste() mutates them
+        return "faiss", [[dict(c) for c in cands] for cands in results]
+    found = await asyncio.to_thread(lambda: [fallback_search(p, k) for p in phrases])
+    sources = {source for source, _ in found}
+    return ("fuzzy" if "fuzzy" in sources else "lexical"), [cands for _, cands in found]
+
+async def attach_namaste(results):
+    """Add NAMASTE mappings to every ICD candidate in place."""
+    icd_codes = {c.get("icd_code") for cands in results for c in cands}
+    mapping = await asyncio.to_thread(namaste_for_icd_codes, icd_codes)
+    for cands in results:
+        for c in cands:
+            maps = mapping.get(c.get("icd_code"), [])
+            c["namaste_code"] = maps[0]["namaste_code"] if maps else None
+            c["namaste"] = maps
+
+# Voice-to-codes pipeline: audio (or a transcript) -> transcript -> phrases -> dual-coded candidates
+@app.post("/api/dictation/code")
+async def dictation_code(file: Optional[UploadFile] = File(None), transcript: Optional[str] = Form(None), k: int = Form(3)):
+    timings = {}
+    t_total = time.perf_counter()
+
+    if file is not None:
+        if not ELEVEN_KEY:
+            raise HTTPException(status_code=500, detail="ElevenLabs API key not configured")
+        if not file.content_type or not file.content_type.startswith('audio/'):
+            raise HTTPException(status_code=400, detail="File must be an audio file")
+        contents = await file.read()
+        t = time.perf_counter()
+        try:
+            transcript = await elevenlabs_stt_async(audio_bytes=contents, api_key=ELEVEN_KEY,
+                                                   content_type=file.content_type, filename=file.filename)
+        except Exception as e:
+            logger.exception("Dictation STT failed")
+            raise HTTPException(status_code=500, detail=f"STT failed: {str(e)}")
+        timings["stt"] = time.perf_counter() - t
+    elif not transcript or not transcript.strip():
+        raise HTTPException(status_code=400, detail="Provide an audio file or a transcript")
+
+    t = time.perf_counter()
+    phrases = extract_clinical_phrases(transcript)
+    timings["extract"] = time.perf_counter() - t
+
+    # one batched embedding + FAISS pass for all phrases
+    t = time.perf_counter()
+    try:
+        source, results = await search_phrases(phrases, k)
+    except ExecutorOverloaded as e:
+        raise overloaded_response(e)
+    timings["search"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    await attach_namaste(results)
+    timings["dual_code"] = time.perf_counter() - t
+    timings["total"] = time.perf_counter() - t_total
+
+    return {
+        "transcript": transcript,
+        "source": source,
+        "phrases": [{"text": p, "candidates": c} for p, c in zip(phrases, results)],
+        "timings_ms": {name: round(v * 1000.0, 2) for name, v in timings.items()},
+    }
+
+# Live dictation over WebSocket.
+# Client sends binary audio chunks, and optionally JSON text frames:
+#   {"type": "start", "content_type": "audio/webm", "k": 3}  and  {"type": "stop"}
+# Server pushes {"type": "partial"}, {"type": "suggestions"} (new fragments only), {"type": "final"}.
+@app.websocket("/ws/dictation")
+async def ws_dictation(websocket: WebSocket):
+    await websocket.accept()
+    if STREAMING_STT_PROVIDER == "elevenlabs" and not ELEVEN_KEY:
+        await websocket.send_json({"type": "error", "detail": "ElevenLabs API key not configured"})
+        await websocket.close(code=1011)
+        return
+    content_type, k = "audio/webm", 3
+    tracker = FragmentTracker()
+    stt = None
+
+    async def push_suggestions(transcript, final=False):
+        fragments = tracker.update(transcript, final=final)
+        if not fragments:
+            return
+        found = {f: fragment_cache.get((f.lower(), k)) for f in fragments}
+        missing = [f for f, cands in found.items() if cands is None]
+        if missing:
+            try:
+                _, results = await search_phrases(missing, k)
+                await attach_namaste(results)
+            except ExecutorOverloaded as e:
+                await websocket.send_json({"type": "error", "detail": str(e), "retry_after": e.retry_after})
+                return
+            for f, cands in zip(missing, results):
+                fragment_cache.put((f.lower(), k), cands)
+                found[f] = cands
+        for f in fragments:
+            await websocket.send_json({"type": "suggestions", "fragment": f, "candidates": found[f], "cached": f not in missing})
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                control = json.loads(message["text"])
+                if control.get("type") == "start":
+                    content_type = control.get("content_type", content_type)
+                    k = int(control.get("k", k))
+                elif control.get("type") == "stop":
+                    if stt is not None:
+                        transcript = await stt.finish()
+                        await push_suggestions(transcript, final=True)
+                        await websocket.send_json({"type": "final", "transcript": transcript})
+                    await websocket.close()
+                    break
+                continue
+            if stt is None:
+                stt = make_streaming_provider(STREAMING_STT_PROVIDER, api_key=ELEVEN_KEY, content_type=content_type)
+            transcript = await stt.feed(message.get("bytes") or b"")
+            if transcript is not None:
+                await websocket.send_json({"type": "partial", "transcript": transcript})
+                await push_suggestions(transcript)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.exception("Live dictation failed")
+        try:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        if stt is not None:
+            await stt.close()
 
 # FHIR bundle ingest - simple validation and persist Condition(s) with dual coding
+def persist_conditions(rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Insert Conditions (and auto-coding jobs for half-coded ones) in one transaction.
+    """
+    with Session(engine) as session:
+        ids = bulk_insert_conditions(session, rows)
+        queued = enqueue_coding_jobs(session, ids, rows)
+        with stage("db_commit"):
+            session.commit()
+    if queued:
+        autocoder.wake()
+    return ids
+
+def persist_bundle(rows: List[Dict[str, Any]]):
+    """
+    Insert all Conditions of a bundle in one transaction (one commit / fsync).
+    The audit event is logged separately through audit_writer.
+    """
+    ids = persist_conditions(rows)
+    return [{"id": i, "namaste": r["namaste_code"], "icd": r["icd_code"]} for i, r in zip(ids, rows)]
+
+def validation_level(level: Optional[str]) -> str:
+    level = level or FHIR_VALIDATION_LEVEL
+    if level not in VALIDATION_LEVELS:
+        raise HTTPException(status_code=400, detail=f"validation must be one of {', '.join(VALIDATION_LEVELS)}")
+    if level == "strict" and not STRICT_AVAILABLE:
+        raise HTTPException(status_code=400, detail="strict validation requires fhir.resources")
+    return level
+
 @app.post("/fhir/bundle/ingest")
-async def ingest_bundle(bundle: Dict[str, Any]):
-    # Validate basic FHIR structure (using fhir.resources in fhir_utils)
+async def ingest_bundle(bundle: Dict[str, Any], validation: Optional[str] = None):
+    """
+    validation=fast checks the elements we persist, validation=strict builds the
+    full fhir.resources model of every resource (default FHIR_VALIDATION_LEVEL).
+    """
+    level = validation_level(validation)
     try:
-        valid = validate_fhir_bundle(bundle)
-        # persist Conditions found (very simple)
-        saved = []
-        with Session(engine) as session:
-            entries = bundle.get("entry", [])
-            for e in entries:
-                res = e.get("resource", {})
-                if res.get("resourceType") == "Condition":
-                    # extract codes
-                    code = res.get("code", {})
-                    codings = code.get("coding", [])
-                    namaste = None; icd = None
-                    for c in codings:
-                        sys = c.get("system","")
-                        if "namaste" in sys.lower():
-                            namaste = c
-                        if "icd" in sys.lower() or "who" in sys.lower():
-                            icd = c
-                    cond = ConditionRecord(
-                        patient_reference = res.get("subject", {}).get("reference"),
-                        namaste_code = namaste.get("code") if namaste else None,
-                        namaste_display = namaste.get("display") if namaste else None,
-                        icd_code = icd.get("code") if icd else None,
-                        icd_display = icd.get("display") if icd else None,
-                    )
-                    session.add(cond)
-                    session.commit()
-                    saved.append({"id": cond.id, "namaste": cond.namaste_code, "icd": cond.icd_code})
-            # audit event
-            ae = AuditEvent(action="bundle_ingest", user="api", resource=json.dumps(bundle))
-            session.add(ae)
-            session.commit()
+        # one pass: validate every entry and collect the Condition rows
+        with stage("fhir_validation"):
+            result = validate_bundle(bundle, level)
+        rows = result["conditions"]
+        saved = await asyncio.to_thread(persist_bundle, rows)
+        # audit event: serialised, compressed and stored by the background audit writer
+        audit_writer.log("bundle_ingest", user="api", payload=bundle,
+                         summary={"entries": result["entries"], "conditions": len(saved), "validation": level})
         return {"status":"accepted","saved": saved}
     except Exception as e:
         logger.exception("Bundle ingest failed")
         raise HTTPException(status_code=400, detail=str(e))
 
+# Streaming ingest for large bundles (JSON Bundle or NDJSON of resources)
+@app.post("/fhir/bundle/ingest/stream")
+async def ingest_bundle_stream(request: Request, detail: str = "errors", validation: Optional[str] = None):
+    """
+    Parse entries incrementally, validate each resource as it arrives and write
+    Conditions in batches of STREAM_INGEST_BATCH. The body is not read further
+    while a batch is being written, so memory stays bounded by the batch size.
+    detail=full also lists the outcome of every entry.
+    """
+    level = validation_level(validation)
+    counts = {"received": 0, "accepted": 0, "rejected": 0, "skipped": 0}
+    errors, outcomes = [], []
+    batch, batch_index = [], []
+    full = detail == "full"
+
+    def record(index, status, **extra):
+        counts[status] += 1
+        if status == "rejected" and len(errors) < STREAM_INGEST_MAX_ERRORS:
+            errors.append({"entry": index, **extra})
+        if full:
+            outcomes.append({"entry": index, "status": status, **extra})
+
+    async def flush():
+        if not batch:
+            return
+        ids = await asyncio.to_thread(persist_conditions, list(batch))
+        for index, row_id in zip(batch_index, ids):
+            record(index, "accepted", id=row_id)
+        batch.clear()
+        batch_index.clear()
+
+    error = None
+    try:
+        async for res in iter_resources(request.headers.get("content-type"), request.stream()):
+            index = counts["received"]
+            counts["received"] += 1
+            if isinstance(res, EntryError):
+                record(index, "rejected", error=str(res))
+                continue
+            try:
+                with stage("fhir_validation_resource"):
+                    rtype, row = validate_resource(res, level)
+            except ValueError as e:
+                record(index, "rejected", resourceType=res.get("resourceType") if isinstance(res, dict) else None,
+                       error=str(e))
+                continue
+            if row is None:
+                record(index, "skipped", resourceType=rtype)
+                continue
+            batch.append(row)
+            batch_index.append(index)
+            if len(batch) >= STREAM_INGEST_BATCH:
+                await flush()
+        await flush()
+    except Exception as e:
+        # entries before the failure have already been committed batch by batch
+        logger.exception("Streaming bundle ingest stopped")
+        error = str(e)
+        counts["rejected"] += len(batch)
+    summary = {**counts, "batch_size": STREAM_INGEST_BATCH, "validation": level}
+    audit_writer.log("bundle_ingest_stream", user="api", summary=summary if error is None else {**summary, "error": error})
+    if error is not None and counts["accepted"] == 0:
+        raise HTTPException(status_code=400, detail={"error": error, **counts})
+    out = {"status": "accepted" if error is None else "partial", **counts, "errors": errors}
+    if error is not None:
+        out["error"] = error
+    if full:
+        out["outcomes"] = sorted(outcomes, key=lambda o: o["entry"])
+    return out
+
+# Bulk export (FHIR Bulk Data style NDJSON, streamed synchronously)
+@app.get("/fhir/$export")
+def fhir_export(types: Optional[str] = Query(None, alias="_type"),
+                since: Optional[str] = Query(None, alias="_since"),
+                compress: bool = Query(False, alias="gzip")):
+    """
+    Stream Condition and ConceptMap resources as NDJSON.
+    _type: comma-separated subset of Condition,ConceptMap; _since: only rows created
+    at or after this instant (epoch seconds or ISO-8601); gzip=true compresses the stream.
+    """
+    selected = [t.strip() for t in types.split(",") if t.strip()] if types else list(EXPORT_TYPES)
+    unknown = [t for t in selected if t not in EXPORT_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported _type: {', '.join(unknown)}")
+    try:
+        since_dt = parse_utc(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="_since must be epoch seconds or ISO-8601")
+    # sync generator: Starlette iterates it in the threadpool, one cursor batch at a time
+    body = iter_export_ndjson(engine, selected, since=since_dt, batch_size=EXPORT_BATCH_SIZE)
+    headers = {"Content-Disposition": 'attachment; filename="export.ndjson"'}
+    if compress:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    audit_writer.log("fhir_export", user="api", summary={"types": selected, "since": since, "gzip": compress})
+    return StreamingResponse(body, media_type="application/fhir+ndjson", headers=headers)
+
+# Auto-coding queue
+@app.get("/admin/autocoding")
+def admin_autocoding():
+    return {"queue": autocoder.queue_counts(), "worker": autocoder.stats()}
+
+@app.get("/api/condition/{condition_id}/suggestions")
+def condition_suggestions(condition_id: int):
+    with Session(engine) as session:
+        jobs = session.exec(select(CodingJob).where(CodingJob.condition_id == condition_id)
+                            .order_by(CodingJob.id)).all()
+        rows = session.exec(select(CodingSuggestion).where(CodingSuggestion.condition_id == condition_id)
+                            .order_by(CodingSuggestion.job_id, CodingSuggestion.rank)).all()
+    suggestions = []
+    for r in rows:
+        item = r.model_dump()
+        item["provenance"] = json.loads(r.provenance) if r.provenance else None
+        suggestions.append(item)
+    return {
+        "condition_id": condition_id,
+        "jobs": [{"id": j.id, "target": j.target, "status": j.status, "attempts": j.attempts, "error": j.error}
+                 for j in jobs],
+        "suggestions": suggestions,
+    }
+
+# Audit log queries
+@app.get("/admin/audit")
+def admin_audit(action: Optional[str] = None, user: Optional[str] = None,
+                since: Optional[str] = None, until: Optional[str] = None, limit: int = 100):
+    try:
+        since_dt, until_dt = parse_utc(since), parse_utc(until)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since/until must be epoch seconds or ISO-8601")
+    events = audit_writer.query(action=action, user=user, since=since_dt, until=until_dt, limit=min(limit, 1000))
+    return {"count": len(events), "events": events}
+
+@app.get("/admin/audit/rollup")
+def admin_audit_rollup(action: Optional[str] = None):
+    return {"rollups": audit_writer.rollups(action=action)}
+
+@app.get("/admin/audit/{event_id}/payload", dependencies=[Depends(require_admin_token)])
+def admin_audit_payload(event_id: int):
+    payload = audit_writer.payload(event_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Audit payload not found")
+    return payload
+
 # Simple admin endpoint to ingest CSV into ConceptMap records (CSV must be uploaded previously to data/)
 @app.post("/admin/ingest/icd_corpus_reload")
 def admin_reload_icd():
     # triggers faiss_svc to reload corpus from ICD_CORPUS_CSV
     faiss_svc.load_icd_corpus()
+    # cached results may point at rows that changed
+    search_cache.clear()
     return {"reloaded": True, "icd_count": faiss_svc.n_items}
 
 # Admin endpoint to rebuild FAISS index (placeholder: calls script)
@@ -235,6 +986,11 @@ def admin_rebuild_index(background_tasks: BackgroundTasks):
     background_tasks.add_task(bg_build)
     return {"started": True}
 
+# Index health: EXPLAIN the patient / condition lookups
+@app.get("/admin/db/indexes")
+def admin_db_indexes():
+    return {"dialect": engine.dialect.name, "queries": check_index_usage(engine)}
+
 # Basic patient endpoints
 @app.get("/api/patient/{abha_id}")
 def get_patient(abha_id: str):
@@ -245,12 +1001,55 @@ def get_patient(abha_id: str):
             raise HTTPException(status_code=404, detail="Patient not found")
         return p
 
+def _csv_param(value: Optional[str]):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+def _history_row(row) -> dict:
+    out = dict(row._mapping)
+    out["created_at"] = out["created_at"].isoformat()
+    return out
+
 @app.get("/api/patient/{abha_id}/history")
-def patient_history(abha_id: str):
+def patient_history(abha_id: str, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None,
+                    order: str = "desc", fields: Optional[str] = None,
+                    namaste_code: Optional[str] = None, icd_code: Optional[str] = None,
+                    format: str = "json"):
+    """
+    Conditions for a patient ordered by (created_at, id), newest first by default.
+    Pages are keyset-paginated: pass back `next_cursor` as `cursor` to continue.
+    fields / namaste_code / icd_code take comma-separated lists.
+    format=ndjson streams every matching row instead of one page.
+    """
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    field_list = _csv_param(fields)
+    unknown = [f for f in field_list or [] if f not in HISTORY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query = dict(after=after, order=order, fields=field_list,
+                 namaste_codes=_csv_param(namaste_code), icd_codes=_csv_param(icd_code))
+    reference = f"Patient/{abha_id}"
+
+    if format == "ndjson":
+        def dump():
+            stmt = patient_history_stmt(reference, **query).execution_options(yield_per=EXPORT_BATCH_SIZE)
+            with Session(engine) as session:
+                for partition in session.execute(stmt).partitions():
+                    yield "".join(json.dumps(_history_row(r)) + "\n" for r in partition).encode("utf-8")
+        return StreamingResponse(dump(), media_type="application/x-ndjson")
+
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
     with Session(engine) as session:
-        stmt = select(ConditionRecord).where(ConditionRecord.patient_reference == f"Patient/{abha_id}")
-        r = session.exec(stmt).all()
-        return {"history": r}
+        # one extra row tells us whether there is a next page
+        rows = session.execute(patient_history_stmt(reference, limit=limit + 1, **query)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    return {"history": [_history_row(r) for r in rows], "count": len(rows), "next_cursor": next_cursor}
 
 # Health / debug route
 @app.get("/ping")
@@ -0,0 +1,280 @@
+# backend/app/metrics.py
+import os
+import time
+import bisect
+import threading
+
+from .tracing import record_stage
+
+# Minimal Prometheus instrumentation without a client library.
+# Counters and histograms keep one shard per thread: observe()/inc() only touch
+# the calling thread's own lists (no lock on the hot path) and scrapes sum the
+# shards. Under app.server every worker process exposes its own values.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Sharded:
+    """
+    Per-thread storage: {label values: series}, registered once per thread.
+    Thread pools reap idle workers and start new ones, so shards of threads
+    that have exited are folded into one retired shard (when the next thread
+    registers, and on scrape); the shard list stays bounded by live threads.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []  # (thread, shard)
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._prune()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _prune(self):
+        # caller holds _lock; an exited thread can no longer write to its shard
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+
+    def _merge(self, into: dict, shard: dict):
+        raise NotImplementedError
+
+    def _all_shards(self):
+        with self._lock:
+            self._prune()
+            # _merge replaces retired series instead of mutating them, so a copy of the dict is a snapshot
+            return [dict(self._retired)] + [shard for _, shard in self._shards]
+
+
+class Counter(_Sharded):
+    def __init__(self, name: str, doc: str, labelnames=()):
+        super().__init__()
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+
+    def inc(self, *labels, amount: float = 1.0):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def _merge(self, into: dict, shard: dict):
+        for labels, v in list(shard.items()):
+            into[labels] = into.get(labels, 0.0) + v
+
+    def collect(self):
+        totals = {}
+        for shard in self._all_shards():
+            for labels, v in list(shard.items()):
+                totals[labels] = totals.get(labels, 0.0) + v
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        for labels, v in sorted(totals.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {v}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "start")
+
+    def __init__(self, hist, labels):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Histogram(_Sharded):
+    def __init__(self, name: str, doc: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__()
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # per-bucket (non-cumulative) counts + [sum, count]
+            series = shard[labels] = [[0] * (len(self.buckets) + 1), [0.0, 0]]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+        series[1][1] += 1
+
+    def _merge(self, into: dict, shard: dict):
+        for labels, (counts, (total, n)) in list(shard.items()):
+            old = into.get(labels)
+            if old is None:
+                into[labels] = [list(counts), [total, n]]
+            else:
+                into[labels] = [[a + b for a, b in zip(old[0], counts)], [old[1][0] + total, old[1][1] + n]]
+
+    def time(self, *labels) -> _Timer:
+        """with hist.time("faiss_search"): ..."""
+        return _Timer(self, labels)
+
+    def collect(self):
+        totals = {}
+        for shard in self._all_shards():
+            for labels, (counts, (total, n)) in list(shard.items()):
+                agg = totals.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                for i, c in enumerate(counts):
+                    agg[0][i] += c
+                agg[1] += total
+                agg[2] += n
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, n) in sorted(totals.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+class Gauge:
+    """Value computed at scrape time by `fn`, which returns a number or {label tuple: number}."""
+    def __init__(self, name: str, doc: str, fn, labelnames=()):
+        self.name, self.doc, self.fn, self.labelnames = name, doc, fn, tuple(labelnames)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.fn()
+        except Exception:
+            return lines
+        if isinstance(value, dict):
+            for labels, v in sorted(value.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {float(v)}")
+        elif value is not None:
+            lines.append(f"{self.name} {float(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "intellicure_http_requests_total", "HTTP requests by route template, method and status.",
+    ("route", "method", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "intellicure_http_request_duration_seconds", "HTTP request latency by route template.",
+    ("route", "method")))
+BACKGROUND_DROPPED = REGISTRY.register(Counter(
+    "intellicure_background_dropped_total", "Items dropped by background writers whose queue stayed full.",
+    ("writer",)))
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "intellicure_stage_duration_seconds",
+    "Latency of internal stages (embed_encode, faiss_search, metadata_lookup, namaste_lookup, "
+    "lexical_search, fallback_search, db_commit, audit_commit, fhir_validation, "
+    "fhir_validation_resource, queue_wait, elevenlabs_stt, elevenlabs_tts, elevenlabs_tts_stream).",
+    ("stage",)))
+
+
+def observe_stage(name: str, seconds: float):
+    """Record one stage duration in the histogram and in the current request trace."""
+    STAGE_LATENCY.observe(seconds, name)
+    record_stage(name, seconds)
+
+
+class _StageTimer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def stage(name: str) -> _StageTimer:
+    """Time a block as one observation of intellicure_stage_duration_seconds{stage=name}."""
+    return _StageTimer(name)
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def process_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return None
+
+
+REGISTRY.register(Gauge("intellicure_process_resident_memory_bytes", "Resident set size of this process.",
+                        process_rss_bytes))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request count and latency per route template
+    (e.g. /api/patient/{abha_id}), so label cardinality stays bounded.
+    Latency runs until the last body chunk is sent, which includes streaming.
+    """
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_LATENCY.observe(time.perf_counter() - start, path, method)
+            HTTP_REQUESTS.inc(path, method, str(status[0]))
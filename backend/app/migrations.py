@@ -0,0 +1,101 @@
+# backend/app/migrations.py
+import logging
+from datetime import datetime
+
+from sqlalchemy import inspect, text, select
+from sqlmodel import SQLModel
+
+logger = logging.getLogger("migrations")
+
+
+def ensure_columns(engine):
+    """
+    Add model-declared columns that are missing from existing tables.
+    Only nullable columns can be added this way (ALTER TABLE ... ADD COLUMN);
+    returns the "table.column" names added.
+    """
+    insp = inspect(engine)
+    added = []
+    for table in SQLModel.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            col_type = column.type.compile(dialect=engine.dialect)
+            name = engine.dialect.identifier_preparer.quote(column.name)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {col_type}"))
+            added.append(f"{table.name}.{column.name}")
+            logger.info(f"Added column {table.name}.{column.name}")
+    return added
+
+
+def ensure_indexes(engine):
+    """
+    Create model-declared indexes that are missing from an existing database.
+    SQLModel.metadata.create_all() only creates indexes together with new tables,
+    so databases created before an index was declared need this step.
+    Works for SQLite and Postgres; returns the names of indexes created.
+    """
+    insp = inspect(engine)
+    created = []
+    for table in SQLModel.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {ix["name"] for ix in insp.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=engine)
+                created.append(index.name)
+                logger.info(f"Created index {index.name} on {table.name}")
+            except Exception:
+                # e.g. duplicate abha_id rows prevent the unique index
+                logger.exception(f"Could not create index {index.name} on {table.name}")
+    return created
+
+
+def explain(engine, stmt):
+    """
+    Return the query plan for a SQLAlchemy statement as a list of strings.
+    """
+    sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        rows = conn.execute(text(prefix + sql)).fetchall()
+    if engine.dialect.name == "sqlite":
+        # (id, parent, notused, detail)
+        return [str(r[-1]) for r in rows]
+    return [str(r[0]) for r in rows]
+
+
+def plan_uses_index(plan) -> bool:
+    joined = " ".join(plan).upper()
+    return any(marker in joined for marker in ("USING INDEX", "USING COVERING INDEX", "USING INTEGER PRIMARY KEY",
+                                               "INDEX SCAN", "INDEX ONLY SCAN", "BITMAP INDEX SCAN"))
+
+
+def check_index_usage(engine):
+    """
+    EXPLAIN the hot patient / condition lookups and report whether each uses an index.
+    Note: Postgres may still choose a sequential scan on very small tables.
+    """
+    from .models import Patient, ConditionRecord
+    from .db import patient_history_stmt
+    queries = {
+        "get_patient": select(Patient).where(Patient.abha_id == "ABHA-CHECK"),
+        "patient_history": select(ConditionRecord)
+            .where(ConditionRecord.patient_reference == "Patient/ABHA-CHECK")
+            .order_by(ConditionRecord.created_at.desc()),
+        "patient_history_page": patient_history_stmt("Patient/ABHA-CHECK", after=(datetime(2024, 1, 1), 1), limit=101),
+        "by_namaste_code": select(ConditionRecord).where(ConditionRecord.namaste_code == "CHECK"),
+        "by_icd_code": select(ConditionRecord).where(ConditionRecord.icd_code == "CHECK"),
+    }
+    report = {}
+    for name, stmt in queries.items():
+        plan = explain(engine, stmt)
+        report[name] = {"plan": plan, "uses_index": plan_uses_index(plan)}
+    return report
@@ -1,29 +1,86 @@
 # backend/app/ml_utils.py
 import os
+import time
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import logging
+
+from .metrics import stage
+
 logger = logging.getLogger("ml_utils")
 
 class EmbeddingService:
     """
     Wraps SentenceTransformer model if present at model_dir.
     If model_dir doesn't exist or cannot be loaded, provides a deterministic dummy embedder.
+    With load=False the model (and torch) is only imported when load() is called,
+    e.g. from the app lifespan; embed() uses the dummy embedder until then.
+
+    mode="sidecar" sends embed() calls to the embedding sidecar process on
+    `sidecar_socket` (see embed_sidecar.py) instead of loading the model here.
+    In that mode there is no dummy fallback: embed() raises SidecarError while
+    the sidecar is unreachable or has no model, and the connection is retried
+    (at most every `reconnect_interval` seconds) until it comes up.
     """
-    def __init__(self, model_dir: str = "./models/gemma_finetuned", dim: int = 512):
+    def __init__(self, model_dir: str = "./models/gemma_finetuned", dim: int = 512, num_threads: int = 0,
+                 load: bool = True, mode: str = "inprocess", sidecar_socket: str = "/tmp/intellicure-embed.sock",
+                 reconnect_interval: float = 5.0):
+        if mode not in ("inprocess", "sidecar"):
+            raise ValueError(f"Unknown embedding mode: {mode}")
         self.model_dir = model_dir
         self.dim = dim
+        self.num_threads = num_threads
+        self.mode = mode
+        self.sidecar = None
+        self.sidecar_connected = False
+        self.reconnect_interval = reconnect_interval
+        self._last_connect_attempt = 0.0
+        self._reconnecting = threading.Lock()
+        if mode == "sidecar":
+            from .embed_sidecar import SidecarClient
+            self.sidecar = SidecarClient(sidecar_socket)
         self.model = None
         self.model_loaded = False
-        self._load_model_if_present()
+        self.load_seconds = None
+        self.forward_profile = None  # profiler.ForwardProfile while a torch capture is running
+        if load:
+            self.load()
+
+    @property
+    def model_loaded(self) -> bool:
+        if self.sidecar is not None and not self.sidecar_connected:
+            self._reconnect_in_background()
+        return self._model_loaded
+
+    @model_loaded.setter
+    def model_loaded(self, value: bool):
+        self._model_loaded = value
+
+    def load(self):
+        if self.load_seconds is not None:
+            # already loaded (e.g. by the preloading master before fork)
+            return self.model_loaded
+        start = time.perf_counter()
+        if self.sidecar is not None:
+            self._connect_sidecar()
+        else:
+            self._load_model_if_present()
+        self.load_seconds = round(time.perf_counter() - start, 3)
+        return self.model_loaded
 
     def _load_model_if_present(self):
         if os.path.exists(self.model_dir) and os.path.isdir(self.model_dir):
             try:
                 logger.info(f"Loading model from {self.model_dir}")
-                self.model = SentenceTransformer(self.model_dir)
-                # update dim
-                self.dim = self.model.get_sentence_embedding_dimension()
+                from sentence_transformers import SentenceTransformer
+                if self.num_threads:
+                    # cap torch intra-op threads so concurrent encodes don't oversubscribe cores
+                    import torch
+                    torch.set_num_threads(self.num_threads)
+                model = SentenceTransformer(self.model_dir)
+                # update dim before publishing the model to concurrent embed() calls
+                self.dim = model.get_sentence_embedding_dimension()
+                self.model = model
                 self.model_loaded = True
                 logger.info(f"Loaded model dim={self.dim}")
             except Exception as e:
@@ -33,12 +90,75 @@ class EmbeddingService:
         else:
             logger.info(f"No model found at {self.model_dir}; using dummy embeddings")
 
+    def _connect_sidecar(self):
+        # raises if the sidecar is not running, so startup reports the component as failed
+        self._last_connect_attempt = time.monotonic()
+        health = self.sidecar.health()
+        self.dim = health["dim"]
+        self._model_loaded = health["model_loaded"]
+        self.sidecar_connected = self._model_loaded
+        logger.info(f"Using embedding sidecar at {self.sidecar.path} (model_loaded={self._model_loaded}, dim={self.dim})")
+
+    def _reconnect_in_background(self):
+        # model_loaded is read on the event loop, so the retry must not block it
+        if time.monotonic() - self._last_connect_attempt < self.reconnect_interval:
+            return
+        if not self._reconnecting.acquire(blocking=False):
+            return
+        self._last_connect_attempt = time.monotonic()
+
+        def run():
+            try:
+                self._connect_sidecar()
+            except Exception as e:
+                logger.debug(f"Embedding sidecar still unavailable: {e}")
+            finally:
+                self._reconnecting.release()
+        threading.Thread(target=run, name="sidecar-reconnect", daemon=True).start()
+
+    def health(self):
+        """In-process: local load state; sidecar: the sidecar's health including its queue depth."""
+        if self.sidecar is None:
+            return {"mode": self.mode, "model_loaded": self.model_loaded, "dim": self.dim}
+        try:
+            return {"mode": self.mode, **self.sidecar.health(), "stats": self.sidecar.stats()}
+        except Exception as e:
+            return {"mode": self.mode, "ok": False, "error": str(e)}
+
+    def freeze_for_inference(self):
+        """
+        Eval mode with requires_grad off on every weight, so nothing writes to the
+        parameter pages (they stay shared copy-on-write between forked workers).
+        """
+        if not self.model_loaded or self.model is None:
+            return
+        self.model.eval()
+        for p in self.model.parameters():
+            p.requires_grad_(False)
+
     def embed(self, texts):
         """
         texts: List[str] -> np.ndarray (N, dim)
         """
+        with stage("embed_encode"):
+            return self._embed(texts)
+
+    def _embed(self, texts):
+        if self.sidecar is not None:
+            if not self.sidecar_connected:
+                # the sidecar may have started after the API; never answer with dummy vectors here
+                self._connect_sidecar()
+                if not self.sidecar_connected:
+                    from .embed_sidecar import SidecarError
+                    raise SidecarError(f"embedding sidecar at {self.sidecar.path} has no model loaded")
+            # the sidecar normalises itself
+            return self.sidecar.embed(texts)
         if self.model_loaded:
-            emb = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+            profile = self.forward_profile
+            if profile is not None:
+                emb = profile.run(self.model.encode, texts, convert_to_numpy=True, show_progress_bar=False)
+            else:
+                emb = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
             # normalize
             norms = np.linalg.norm(emb, axis=1, keepdims=True)
             norms[norms==0] = 1.0
@@ -1,22 +1,27 @@
 # backend/app/models.py
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from typing import Optional
 from datetime import datetime
 
 class Patient(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    abha_id: str
+    abha_id: str = Field(index=True, unique=True)
     name: Optional[str] = None
     dob: Optional[str] = None
     meta: Optional[str] = None  # JSON string for demo
 
 class ConditionRecord(SQLModel, table=True):
+    # patient history is always read as "this patient's conditions by time"
+    __table_args__ = (
+        Index("ix_conditionrecord_patient_reference_created_at", "patient_reference", "created_at"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     patient_reference: Optional[str] = None  # e.g. "Patient/ABHA-1234"
-    namaste_code: Optional[str] = None
+    namaste_code: Optional[str] = Field(default=None, index=True)
     namaste_display: Optional[str] = None
-    icd_code: Optional[str] = None
+    icd_code: Optional[str] = Field(default=None, index=True)
     icd_display: Optional[str] = None
     provenance: Optional[str] = None
 
@@ -25,7 +30,7 @@ class ConceptMapRecord(SQLModel, table=True):
     source_system: str
     source_code: str
     target_system: str
-    target_code: str
+    target_code: str = Field(index=True)
     equivalence: Optional[str] = None
     confidence: Optional[float] = None
     curator: Optional[str] = None
@@ -33,7 +38,50 @@ class ConceptMapRecord(SQLModel, table=True):
 
 class AuditEvent(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
     user: Optional[str] = None
     action: Optional[str] = None
-    resource: Optional[str] = None  # Small JSON string
+    resource: Optional[str] = None  # Small JSON string (large payloads live in the audit blob store)
+    payload_digest: Optional[str] = Field(default=None, index=True)  # sha256 of the uncompressed payload
+    payload_size: Optional[int] = None  # uncompressed payload size in bytes
+    summary: Optional[str] = None  # small JSON summary of the payload
+
+class AuditRollup(SQLModel, table=True):
+    # daily counts of audit events that were removed by retention
+    __table_args__ = (
+        Index("ix_auditrollup_day_action_user", "day", "action", "user", unique=True),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: str  # YYYY-MM-DD
+    action: Optional[str] = None
+    user: Optional[str] = None
+    count: int = 0
+    payload_bytes: int = 0
+
+class CodingJob(SQLModel, table=True):
+    # background auto-coding of Conditions that arrived with only one side of the dual code
+    __table_args__ = (
+        Index("ix_codingjob_status_id", "status", "id"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    condition_id: int = Field(index=True)
+    target: str  # "icd" or "namaste": the side that is missing
+    status: str = "pending"  # pending | running | done | failed
+    attempts: int = 0
+    claimed_by: Optional[str] = None
+    claimed_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class CodingSuggestion(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    condition_id: int = Field(index=True)
+    job_id: Optional[int] = None
+    target: str  # "icd" or "namaste"
+    rank: int
+    code: Optional[str] = None
+    display: Optional[str] = None
+    score: Optional[float] = None
+    provenance: Optional[str] = None  # JSON: method, query text, model / index used
+    created_at: datetime = Field(default_factory=datetime.utcnow)
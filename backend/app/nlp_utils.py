@@ -0,0 +1,79 @@
+# backend/app/nlp_utils.py
+import re
+
+# clause boundaries in dictated text: sentence punctuation, commas/semicolons and joining words
+_SPLIT_RE = re.compile(r"[.;,:!?\n]+|\b(?:and|also|with|plus|along with|as well as)\b", re.IGNORECASE)
+
+# lead-in words that carry no clinical meaning on their own ("patient complains of ...")
+_LEAD_WORDS = {
+    "the", "a", "an", "some", "mild", "severe", "patient", "pt", "he", "she", "they",
+    "is", "has", "have", "had", "was", "present", "presents", "presenting", "complain", "complains",
+    "complaining", "reports", "reporting", "suffering", "diagnosed", "known", "case", "history",
+    "c/o", "h/o", "k/c/o", "with", "of", "from", "for",
+}
+
+# trailing durations ("... since three days", "... for 2 weeks")
+_DURATION_RE = re.compile(r"\s+(?:since|for|x)\s+(?:the\s+)?(?:last\s+|past\s+)?[\w\s]*?(?:day|week|month|year|hour)s?\s*$", re.IGNORECASE)
+
+_FILLER = {"uh", "um", "okay", "ok", "so", "yes", "no", "doctor", "patient", "today"}
+
+
+def extract_clinical_phrases(transcript: str, max_phrases: int = 16, min_chars: int = 3):
+    """
+    Split a dictated transcript into short candidate clinical phrases.
+    Very simple rule-based chunking: split on clause boundaries, strip lead-ins
+    ("patient complains of ...") and drop fillers / duplicates.
+    """
+    if not transcript:
+        return []
+    phrases = []
+    seen = set()
+    for part in _SPLIT_RE.split(transcript):
+        if not part:
+            continue
+        words = part.split()
+        while words and words[0].lower() in _LEAD_WORDS:
+            words.pop(0)
+        phrase = _DURATION_RE.sub("", " ".join(words))
+        phrase = phrase.strip(" -'\"")
+        key = phrase.lower()
+        if len(phrase) < min_chars or key in _FILLER or key in seen:
+            continue
+        seen.add(key)
+        phrases.append(phrase)
+        if len(phrases) >= max_phrases:
+            break
+    return phrases
+
+
+def stable_prefix(transcript: str) -> str:
+    """
+    Part of a partial (still changing) transcript up to its last clause boundary.
+    Clauses after that boundary may still be revised by the recogniser.
+    """
+    if not transcript:
+        return ""
+    end = 0
+    for m in _SPLIT_RE.finditer(transcript):
+        end = m.start()
+    return transcript[:end]
+
+
+class FragmentTracker:
+    """
+    Tracks which clinical phrases of a growing transcript have already been seen,
+    so live dictation only searches new fragments.
+    """
+    def __init__(self, max_phrases: int = 256):
+        self.max_phrases = max_phrases
+        self.seen = set()
+
+    def update(self, transcript: str, final: bool = False):
+        text = transcript if final else stable_prefix(transcript)
+        new = []
+        for phrase in extract_clinical_phrases(text, max_phrases=self.max_phrases):
+            key = phrase.lower()
+            if key not in self.seen:
+                self.seen.add(key)
+                new.append(phrase)
+        return new
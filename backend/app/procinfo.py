@@ -0,0 +1,65 @@
+# backend/app/procinfo.py
+import os
+
+# fields of /proc/<pid>/smaps_rollup we report, in kB
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Anonymous", "Swap")
+
+
+def smaps_rollup(pid="self"):
+    """
+    Memory summary of a process from /proc/<pid>/smaps_rollup (Linux >= 4.14).
+    Pss charges each shared page 1/N to each of the N processes mapping it, so
+    summing Pss over master + workers gives the real footprint. Returns None
+    where the file is unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    out = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].rstrip(":") in SMAPS_FIELDS:
+            out[parts[0].rstrip(":").lower() + "_kb"] = int(parts[1])
+    return out
+
+
+def child_pids(ppid: int):
+    """PIDs whose parent is `ppid` (scans /proc; no psutil needed)."""
+    pids = []
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return pids
+    for name in entries:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # the command name may contain spaces; fields after it are space separated
+        fields = stat[stat.rfind(")") + 2:].split()
+        if len(fields) > 1 and int(fields[1]) == ppid:
+            pids.append(int(name))
+    return sorted(pids)
+
+
+def memory_report(master_pid: int = None):
+    """
+    Memory of this process and, in preload-and-fork mode, of the master and
+    all of its workers, with Pss totals across the whole group.
+    """
+    report = {"pid": os.getpid(), "self": smaps_rollup()}
+    if not master_pid:
+        return report
+    group = {"master": {"pid": master_pid, **(smaps_rollup(master_pid) or {})}, "workers": []}
+    for pid in child_pids(master_pid):
+        group["workers"].append({"pid": pid, **(smaps_rollup(pid) or {})})
+    members = [group["master"]] + group["workers"]
+    group["total_pss_kb"] = sum(m.get("pss_kb", 0) for m in members)
+    group["total_rss_kb"] = sum(m.get("rss_kb", 0) for m in members)
+    report["group"] = group
+    return report
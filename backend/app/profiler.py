@@ -0,0 +1,186 @@
+# backend/app/profiler.py
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger("profiler")
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# leaf frames of threads that are blocked waiting for work rather than running
+IDLE_LEAVES = frozenset({
+    "threading:Condition.wait",
+    "selectors:EpollSelector.select",
+    "selectors:PollSelector.select",
+    "selectors:KqueueSelector.select",
+    "selectors:SelectSelector.select",
+    "thread:_worker",  # concurrent.futures pool thread blocked on its queue
+})
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _frame_name(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(APP_DIR):
+        module = "app." + os.path.splitext(os.path.relpath(filename, APP_DIR))[0].replace(os.sep, ".")
+    else:
+        module = os.path.splitext(os.path.basename(filename))[0]
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class SamplingProfiler:
+    """
+    Wall-clock stack sampler for the current process: run() reads
+    sys._current_frames() every `interval` seconds for `duration` seconds from
+    the thread it is called on. Nothing is installed in the profiled threads
+    (no sys.setprofile), so the cost is one stack walk per thread per sample,
+    paid by the sampling thread.
+
+    app_only keeps only samples whose stack contains a frame from the app
+    package; samples of threads blocked waiting for work (IDLE_LEAVES) are
+    always dropped, so the output shows where CPU / wall time is spent.
+    """
+    def __init__(self, duration: float, interval: float = 0.005, app_only: bool = True):
+        self.duration = duration
+        self.interval = interval
+        self.app_only = app_only
+        self.idle = 0
+        self.stacks = Counter()
+        self.samples = 0
+        self.ticks = 0
+        self.elapsed = 0.0
+
+    def _sample(self, own_ident: int, thread_names: dict):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            names = []
+            in_app = False
+            while frame is not None:
+                code = frame.f_code
+                in_app = in_app or code.co_filename.startswith(APP_DIR)
+                names.append(_frame_name(code))
+                frame = frame.f_back
+            if names[0] in IDLE_LEAVES:
+                self.idle += 1
+                continue
+            if self.app_only and not in_app:
+                continue
+            names.append(thread_names.get(ident, f"thread-{ident}"))
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def run(self):
+        """Sample until duration has elapsed (blocking; call from a worker thread)."""
+        own = threading.get_ident()
+        start = time.perf_counter()
+        deadline = start + self.duration
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            self._sample(own, thread_names)
+            self.ticks += 1
+            time.sleep(max(0.0, min(self.interval - (time.perf_counter() - now), deadline - time.perf_counter())))
+        self.elapsed = time.perf_counter() - start
+        return self
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format (flamegraph.pl, speedscope, inferno)."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, n: int = 30):
+        """Functions by inclusive (on stack) and self (leaf) sample counts."""
+        total, own = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]  # drop the thread name
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        samples = self.samples or 1
+        return [{"function": name, "total": count, "total_pct": round(100.0 * count / samples, 2),
+                 "self": own[name], "self_pct": round(100.0 * own[name] / samples, 2)}
+                for name, count in total.most_common(n)]
+
+    def summary(self, n: int = 30) -> dict:
+        return {"duration_s": round(self.elapsed, 3), "interval_ms": self.interval * 1000.0,
+                "ticks": self.ticks, "samples": self.samples, "idle_samples": self.idle, "app_only": self.app_only,
+                "top": self.top(n)}
+
+
+class ForwardProfile:
+    """
+    torch.profiler capture of the model forward passes that happen while it is
+    installed (see EmbeddingService.forward_profile). The profiler is thread-local,
+    so it wraps each encode call in the thread running it; concurrent calls and
+    calls beyond max_calls are not profiled rather than serialised. The first
+    capture in a process also initialises the torch profiler (about a second).
+    """
+    def __init__(self, max_calls: int = 50):
+        import torch.profiler
+        self._profiler = torch.profiler
+        self._lock = threading.Lock()
+        self.max_calls = max_calls
+        self.calls = 0
+        self.skipped = 0
+        self.ops = {}
+
+    def run(self, fn, *args, **kwargs):
+        if self.calls >= self.max_calls or not self._lock.acquire(blocking=False):
+            self.skipped += 1
+            return fn(*args, **kwargs)
+        try:
+            with self._profiler.profile(activities=[self._profiler.ProfilerActivity.CPU]) as prof:
+                result = fn(*args, **kwargs)
+            for evt in prof.key_averages():
+                count, total_us, self_us = self.ops.get(evt.key, (0, 0.0, 0.0))
+                self.ops[evt.key] = (count + evt.count, total_us + evt.cpu_time_total,
+                                     self_us + evt.self_cpu_time_total)
+            self.calls += 1
+            return result
+        finally:
+            self._lock.release()
+
+    def summary(self, n: int = 30) -> dict:
+        rows = sorted(self.ops.items(), key=lambda kv: kv[1][2], reverse=True)[:n]
+        return {"profiled_calls": self.calls, "skipped_calls": self.skipped,
+                "ops": [{"op": key, "count": count, "cpu_total_ms": round(total / 1000.0, 3),
+                         "cpu_self_ms": round(own / 1000.0, 3)} for key, (count, total, own) in rows]}
+
+
+_busy = threading.Lock()
+
+
+def profile_process(duration: float, interval: float, app_only: bool = True, embed_service=None,
+                    torch_forward: bool = False, top: int = 30) -> dict:
+    """
+    Run one sampling profile (and optionally a forward-pass capture on
+    embed_service) of this process. Only one profile runs at a time per process.
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running in this worker")
+    forward = None
+    try:
+        if torch_forward:
+            forward = ForwardProfile()
+            embed_service.forward_profile = forward
+        logger.info(f"Profiling pid {os.getpid()} for {duration:.1f}s (interval {interval * 1000.0:.1f}ms)")
+        sampler = SamplingProfiler(duration, interval, app_only=app_only).run()
+    finally:
+        if forward is not None:
+            embed_service.forward_profile = None
+        _busy.release()
+    result = {"pid": os.getpid(), **sampler.summary(top), "collapsed": sampler.collapsed()}
+    if forward is not None:
+        result["torch"] = forward.summary(top)
+    return result
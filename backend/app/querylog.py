@@ -0,0 +1,190 @@
+# backend/app/querylog.py
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+
+from .archive import JsonlArchive
+
+logger = logging.getLogger("querylog")
+
+# endpoints whose requests are captured for replay (scripts/replay_queries.py)
+CAPTURE_PATHS = frozenset({
+    "/api/search/icd",
+    "/api/embed",
+    "/api/tts",
+    "/fhir/bundle/ingest",
+    "/fhir/bundle/ingest/stream",
+})
+
+# set by scripts/replay_queries.py
+REPLAY_HEADER = b"x-replay"
+
+_EMAIL_RE = re.compile(r"\b\S+@\S+\b")
+# ABHA numbers, phone numbers, MRNs: runs of 6+ digits, optionally separated by - or space
+_NUMBER_RE = re.compile(r"\b\d(?:[\s-]?\d){5,}\b")
+
+# Condition elements that carry no patient identity and are needed to reproduce ingest work
+_CONDITION_KEEP = ("resourceType", "code", "clinicalStatus", "verificationStatus", "category", "severity")
+
+
+def scrub_text(text: str) -> str:
+    """Replace e-mail / ABHA addresses and long digit runs in free text."""
+    return _NUMBER_RE.sub("<number>", _EMAIL_RE.sub("<address>", text))
+
+
+class Anonymiser:
+    """
+    Turns a captured request body into one that is safe to keep: free text is
+    scrubbed, FHIR resources keep only coding elements and patient references
+    become salted pseudonyms (stable within one salt, so per-patient request
+    patterns survive).
+    """
+    def __init__(self, salt: str):
+        self.salt = salt.encode("utf-8")
+
+    def pseudonym(self, value: str) -> str:
+        return "anon-" + hashlib.sha256(self.salt + str(value).encode("utf-8")).hexdigest()[:16]
+
+    def resource(self, res):
+        if not isinstance(res, dict):
+            return None
+        rtype = res.get("resourceType")
+        if rtype == "Condition":
+            out = {k: res[k] for k in _CONDITION_KEEP if k in res}
+            code = out.get("code")
+            if isinstance(code, dict) and "text" in code:
+                out["code"] = {**code, "text": scrub_text(str(code["text"]))}
+            ref = (res.get("subject") or {}).get("reference") if isinstance(res.get("subject"), dict) else None
+            if ref:
+                kind, _, ident = str(ref).rpartition("/")
+                out["subject"] = {"reference": f"{kind or 'Patient'}/{self.pseudonym(ident)}"}
+            return out
+        if rtype == "Patient":
+            out = {"resourceType": "Patient"}
+            if res.get("id"):
+                out["id"] = self.pseudonym(res["id"])
+            return out
+        return {"resourceType": rtype} if rtype else None
+
+    def bundle(self, bundle):
+        if not isinstance(bundle, dict):
+            return None
+        entries = []
+        for entry in bundle.get("entry") or []:
+            res = self.resource(entry.get("resource") if isinstance(entry, dict) else None)
+            if res is not None:
+                entries.append({"resource": res})
+        return {"resourceType": bundle.get("resourceType", "Bundle"), "type": bundle.get("type"), "entry": entries}
+
+    def body(self, path: str, content_type: str, raw: bytes):
+        """Anonymised body as a string, or None if it cannot be made safe."""
+        text = raw.decode("utf-8")
+        if path.startswith("/fhir/") and "ndjson" in (content_type or ""):
+            lines = []
+            for line in text.splitlines():
+                if line.strip():
+                    res = self.resource(json.loads(line))
+                    if res is not None:
+                        lines.append(json.dumps(res, separators=(",", ":")))
+            return "\n".join(lines) + "\n"
+        data = json.loads(text)
+        if path.startswith("/fhir/"):
+            data = self.bundle(data)
+        elif isinstance(data, dict):
+            data = {k: scrub_text(v) if k == "text" and isinstance(v, str) else v for k, v in data.items()}
+        else:
+            return None
+        return json.dumps(data, separators=(",", ":"))
+
+
+class QueryLog(JsonlArchive):
+    """
+    Capture of replayable requests. The request path only copies the raw body
+    into the writer queue; anonymisation happens on the writer thread, before
+    anything is written to disk.
+    """
+    def __init__(self, directory: str, salt: str = None, max_body_bytes: int = 1024 * 1024,
+                 enabled: bool = False, **kwargs):
+        super().__init__(directory, prefix="queries", **kwargs)
+        # without a configured salt pseudonyms are only stable until restart
+        self.anonymiser = Anonymiser(salt or os.urandom(16).hex())
+        self.max_body_bytes = max_body_bytes
+        self.enabled = enabled
+        self.captured = 0
+        self.skipped_bodies = 0
+
+    def process_batch(self, batch):
+        records = []
+        for item in batch:
+            raw = item.pop("raw_body", None)
+            if raw is not None:
+                try:
+                    item["body"] = self.anonymiser.body(item["path"], item.get("content_type"), raw)
+                except (ValueError, UnicodeDecodeError, AttributeError):
+                    item["body"] = None
+            if item.get("body") is None:
+                self.skipped_bodies += 1
+            records.append(item)
+        super().process_batch(records)
+
+    def stats(self):
+        return {**super().stats(), "enabled": self.enabled, "captured": self.captured,
+                "skipped_bodies": self.skipped_bodies, "max_body_bytes": self.max_body_bytes}
+
+
+class QueryCaptureMiddleware:
+    """
+    ASGI middleware recording POSTs to CAPTURE_PATHS (timestamp, body, status,
+    latency) into a QueryLog while capture is enabled. Bodies larger than
+    max_body_bytes are recorded without a body (the replay tool skips them).
+    Requests sent by the replay tool (REPLAY_HEADER) are not captured again.
+    """
+    def __init__(self, app, log: QueryLog):
+        self.app = app
+        self.log = log
+
+    async def __call__(self, scope, receive, send):
+        log = self.log
+        if (not log.enabled or scope["type"] != "http" or scope.get("method") != "POST"
+                or scope["path"] not in CAPTURE_PATHS):
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        if REPLAY_HEADER in headers:
+            return await self.app(scope, receive, send)
+        started_wall = time.time()
+        started = time.perf_counter()
+        chunks, size, status = [], [0], [500]
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                size[0] += len(body)
+                if size[0] <= log.max_body_bytes:
+                    chunks.append(body)
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            record = {
+                "ts": started_wall,
+                "path": scope["path"],
+                "query_string": scope.get("query_string", b"").decode("latin-1"),
+                "content_type": headers.get(b"content-type", b"").decode("latin-1"),
+                "body_bytes": size[0],
+                "status": status[0],
+                "latency_ms": round((time.perf_counter() - started) * 1000.0, 3),
+            }
+            if size[0] <= log.max_body_bytes:
+                record["raw_body"] = b"".join(chunks)
+            log.captured += 1
+            log.append(record)
@@ -0,0 +1,67 @@
+# backend/app/readiness.py
+import time
+import logging
+import threading
+
+logger = logging.getLogger("readiness")
+
+PROCESS_STARTED = time.time()  # first import of the app package, close to process start
+
+
+class ComponentRegistry:
+    """
+    Load state of the services initialised at startup.
+    Each component goes pending -> loading -> ready | failed and records how
+    long its initialisation took. A failed component is reported but does not
+    block readiness unless it is listed as required. A ready component whose
+    check (see check()) currently returns False is reported as degraded.
+    """
+    def __init__(self, required=()):
+        self.required = set(required)
+        self._lock = threading.Lock()
+        self._components = {}
+        self._checks = {}
+
+    def register(self, *names):
+        with self._lock:
+            for name in names:
+                self._components.setdefault(name, {"state": "pending"})
+
+    def check(self, name: str, fn):
+        """fn() -> bool, evaluated on every snapshot: is `name` serving for real (not a fallback)?"""
+        self._checks[name] = fn
+
+    def run(self, name: str, fn, *args, **kwargs):
+        """Run fn as the initialisation of `name`, recording state and timing. Never raises."""
+        with self._lock:
+            self._components[name] = {"state": "loading", "started_at": time.time()}
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+            state, error = "ready", None
+        except Exception as e:
+            logger.exception(f"Startup component {name} failed")
+            result, state, error = None, "failed", str(e)
+        elapsed = round((time.perf_counter() - start) * 1000, 1)
+        with self._lock:
+            self._components[name].update(state=state, duration_ms=elapsed, error=error)
+        logger.info(f"Startup component {name}: {state} in {elapsed} ms")
+        return result
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            for name, c in self._components.items():
+                if c["state"] in ("pending", "loading"):
+                    return False
+                if c["state"] == "failed" and name in self.required:
+                    return False
+            return True
+
+    def snapshot(self):
+        with self._lock:
+            snap = {name: dict(c) for name, c in self._components.items()}
+        for name, c in snap.items():
+            check = self._checks.get(name)
+            if c["state"] == "ready" and check is not None and not check():
+                c["state"] = "degraded"
+        return snap
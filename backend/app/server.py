@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Preload-and-fork server.
+
+Usage (from backend/):
+  python -m app.server --workers 4 --port 8010
+
+The master process imports the app, creates / migrates the database schema,
+loads the embedding model and FAISS index once, freezes the model for inference and gc.freeze()s the heap, then binds the
+listening socket and forks the workers. Workers share the model / index pages
+copy-on-write instead of each loading their own copy, and accept on the shared
+socket. The master restarts workers that die and forwards SIGTERM / SIGINT.
+
+The master must not start threads, event loops or keep database connections
+open before forking; those are created by the app lifespan inside each worker
+(which skips the schema step the master already ran).
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+import logging
+
+import uvicorn
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("server")
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--host", default=os.environ.get("SERVER_HOST", "0.0.0.0"))
+    p.add_argument("--port", type=int, default=int(os.environ.get("SERVER_PORT", "8010")))
+    p.add_argument("--workers", type=int, default=int(os.environ.get("SERVER_WORKERS", "2")))
+    p.add_argument("--backlog", type=int, default=2048)
+    p.add_argument("--log-level", default=os.environ.get("SERVER_LOG_LEVEL", "info"))
+    return p.parse_args()
+
+
+def preload():
+    """Import the app and load the shared, read-only state in the master."""
+    from . import main
+    start = time.perf_counter()
+    # DDL runs once here rather than concurrently in every worker
+    main.prepare_database()
+    main.engine.dispose()
+    main.components.run("embedding_model", main.embed_svc.load)
+    main.components.run("faiss_index", main.faiss_svc.load)
+    main.embed_svc.freeze_for_inference()
+    # no warm-up here: running torch ops would start its thread pools before fork
+    gc.collect()
+    # move everything allocated so far to the permanent generation, so the workers'
+    # garbage collector never writes to (and un-shares) these pages
+    gc.freeze()
+    logger.info(f"Preloaded model={main.embed_svc.model_loaded} index={main.faiss_svc.index_loaded} "
+                f"in {time.perf_counter() - start:.1f}s")
+    return main
+
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(main, sock: socket.socket, log_level: str):
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # never reuse pooled connections across fork
+    main.engine.dispose(close=False)
+    config = uvicorn.Config(main.app, log_level=log_level, lifespan="on")
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def spawn(main, sock, log_level) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(main, sock, log_level)
+        except BaseException:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info(f"Started worker {pid}")
+    return pid
+
+
+def serve(args):
+    main = preload()
+    sock = bind(args.host, args.port, args.backlog)
+    # lets workers find their siblings for the /admin/status memory report
+    os.environ["SERVER_MASTER_PID"] = str(os.getpid())
+    logger.info(f"Listening on {args.host}:{args.port} with {args.workers} workers")
+
+    workers = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        workers.add(spawn(main, sock, args.log_level))
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if stopping:
+            continue
+        logger.warning(f"Worker {pid} exited with status {status}; restarting")
+        time.sleep(1.0)
+        workers.add(spawn(main, sock, args.log_level))
+    sock.close()
+    logger.info("All workers stopped")
+
+
+if __name__ == "__main__":
+    sys.exit(serve(parse_args()))
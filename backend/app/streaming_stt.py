@@ -0,0 +1,171 @@
+# backend/app/streaming_stt.py
+import os
+import time
+import asyncio
+import logging
+
+from .elevenlabs import get_client, _archive_stt_result
+
+logger = logging.getLogger("streaming_stt")
+
+STREAMING_STT_INTERVAL = float(os.environ.get("STREAMING_STT_INTERVAL", "2.0"))
+STREAMING_STT_MIN_NEW_BYTES = int(os.environ.get("STREAMING_STT_MIN_NEW_BYTES", "8000"))
+# audio re-sent per partial is capped at about this much; older audio is committed
+STREAMING_STT_WINDOW_BYTES = int(os.environ.get("STREAMING_STT_WINDOW_BYTES", "240000"))
+
+
+class StreamingSTTProvider:
+    """
+    Interface for live-dictation speech-to-text.
+    Audio chunks are fed in as they are recorded; feed() returns the updated
+    partial transcript when there is one, finish() returns the final transcript.
+    """
+    name = "base"
+
+    async def feed(self, chunk: bytes):
+        raise NotImplementedError
+
+    async def finish(self) -> str:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class StubStreamingSTT(StreamingSTTProvider):
+    """
+    Local provider for tests and offline development: every chunk is treated
+    as UTF-8 text and appended to the transcript. Only selected through the
+    server's STREAMING_STT_PROVIDER setting, never by clients.
+    """
+    name = "stub"
+
+    def __init__(self):
+        self.transcript = ""
+
+    async def feed(self, chunk: bytes):
+        text = chunk.decode("utf-8", "replace")
+        if not text:
+            return None
+        self.transcript += text
+        return self.transcript
+
+    async def finish(self) -> str:
+        return self.transcript
+
+
+class ElevenLabsStreamingSTT(StreamingSTTProvider):
+    """
+    Incremental transcription on top of the ElevenLabs batch STT API.
+
+    Partial transcripts are produced by a background task, at most every
+    `interval` seconds once at least `min_new_bytes` of new audio arrived, so
+    feed() never waits on the API. Latest wins: audio that arrives while a
+    request is in flight is covered by the next one, and feed() returns the
+    newest partial that has not been returned yet.
+
+    Only the open window of audio is kept and re-sent: once it reaches
+    `window_bytes`, its transcript is committed, its chunks are dropped and
+    later requests send the first chunk (the container header) plus the chunks
+    after the commit point (MediaRecorder chunks concatenate into a valid
+    stream). Partials are not archived; the final transcript is, once, by finish().
+    """
+    name = "elevenlabs"
+
+    def __init__(self, api_key: str, content_type: str = "audio/webm",
+                 interval: float = STREAMING_STT_INTERVAL, min_new_bytes: int = STREAMING_STT_MIN_NEW_BYTES,
+                 window_bytes: int = STREAMING_STT_WINDOW_BYTES):
+        self.client = get_client(api_key)
+        self.content_type = content_type
+        self.interval = interval
+        self.min_new_bytes = min_new_bytes
+        self.window_bytes = window_bytes
+        self.header = None  # first chunk, re-sent with every window
+        self.chunks = []  # chunks of the open window; chunk numbers below count from the start
+        self.n_chunks = 0
+        self.total_bytes = 0
+        self.scheduled_bytes = 0  # audio covered by the last request started
+        self.transcribed_chunks = 0  # chunks covered by the last request that succeeded
+        self.commit_index = 0  # number of the first chunk of the open window
+        self.committed = ""
+        self.window_text = ""
+        self.unreported = None
+        self.last_run = 0.0
+        self.task = None
+        self.uploaded_bytes = 0
+
+    @property
+    def transcript(self) -> str:
+        return " ".join(t for t in (self.committed, self.window_text) if t)
+
+    def _window(self, end: int) -> bytes:
+        audio = b"".join(self.chunks[:end - self.commit_index])
+        if self.commit_index == 0:
+            return audio
+        return self.header + audio
+
+    async def _transcribe(self, end: int, final: bool = False):
+        audio = self._window(end)
+        self.uploaded_bytes += len(audio)
+        try:
+            text = await self.client.stt(audio, content_type=self.content_type, filename="live", archive=False)
+        except Exception as e:
+            if final:
+                raise
+            # a failed partial is not fatal; the next request covers the same audio
+            logger.warning(f"Partial transcription failed: {e}")
+            return
+        self.window_text = text.strip()
+        self.transcribed_chunks = end
+        if not final and sum(map(len, self.chunks[:end - self.commit_index])) >= self.window_bytes:
+            self.committed = self.transcript
+            self.window_text = ""
+            del self.chunks[:end - self.commit_index]
+            self.commit_index = end
+        self.unreported = self.transcript
+
+    async def feed(self, chunk: bytes):
+        if chunk:
+            chunk = bytes(chunk)
+            if self.header is None:
+                self.header = chunk
+            self.chunks.append(chunk)
+            self.n_chunks += 1
+            self.total_bytes += len(chunk)
+        idle = self.task is None or self.task.done()
+        if (idle and self.total_bytes - self.scheduled_bytes >= self.min_new_bytes
+                and time.monotonic() - self.last_run >= self.interval):
+            self.scheduled_bytes = self.total_bytes
+            self.last_run = time.monotonic()
+            self.task = asyncio.create_task(self._transcribe(self.n_chunks))
+        partial, self.unreported = self.unreported, None
+        return partial
+
+    async def finish(self) -> str:
+        if self.task is not None:
+            await self.task
+        if self.transcribed_chunks < self.n_chunks:
+            await self._transcribe(self.n_chunks, final=True)
+        transcript = self.transcript
+        if self.n_chunks:
+            _archive_stt_result({
+                "audio_size_bytes": self.total_bytes,
+                "uploaded_bytes": self.uploaded_bytes,
+                "extracted_text": transcript,
+                "method": "streaming",
+            })
+        return transcript
+
+    async def close(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+
+def make_streaming_provider(name: str, api_key: str = "", content_type: str = "audio/webm") -> StreamingSTTProvider:
+    if name == "stub":
+        return StubStreamingSTT()
+    if name == "elevenlabs":
+        if not api_key:
+            raise RuntimeError("ElevenLabs API key not configured")
+        return ElevenLabsStreamingSTT(api_key, content_type=content_type)
+    raise ValueError(f"Unknown streaming STT provider: {name}")
@@ -0,0 +1,145 @@
+# backend/app/tracing.py
+import time
+import random
+import logging
+import contextvars
+
+logger = logging.getLogger("tracing")
+
+# the trace of the request being handled; stage timers (metrics.stage) add to it
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    """Stage durations and annotations (query, k, ...) of one request."""
+    __slots__ = ("method", "path", "started", "stages", "attrs")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.attrs = {}
+
+    def add(self, name: str, seconds: float):
+        # stages may run in executor threads; a lost update only skews one trace
+        total, count = self.stages.get(name, (0.0, 0))
+        self.stages[name] = (total + seconds, count + 1)
+
+    def breakdown_ms(self) -> dict:
+        return {name: {"ms": round(total * 1000.0, 3), "count": count}
+                for name, (total, count) in self.stages.items()}
+
+    def server_timing(self, total: float) -> str:
+        parts = [f"{name};dur={s * 1000.0:.3f}" for name, (s, _) in self.stages.items()]
+        parts.append(f"total;dur={total * 1000.0:.3f}")
+        return ", ".join(parts)
+
+
+def record_stage(name: str, seconds: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+def annotate(**attrs):
+    """Attach fields to the current request's slow-log record (no-op when tracing is off)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+class Tracer:
+    """
+    Runtime-switchable request tracing: a Server-Timing response header with the
+    stage breakdown, and a sampled log of requests slower than slow_ms written
+    to `archive` (a JsonlArchive) and the "tracing" logger.
+    """
+    def __init__(self, server_timing: bool = False, slow_log: bool = False, slow_ms: float = 1000.0,
+                 sample_rate: float = 1.0, archive=None):
+        self.server_timing = server_timing
+        self.slow_log = slow_log
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.archive = archive
+        self.traced = 0
+        self.slow = 0
+        self.logged = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.server_timing or self.slow_log
+
+    def configure(self, server_timing=None, slow_log=None, slow_ms=None, sample_rate=None):
+        if slow_ms is not None and slow_ms < 0:
+            raise ValueError("slow_ms must be >= 0")
+        if sample_rate is not None and not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if server_timing is not None:
+            self.server_timing = bool(server_timing)
+        if slow_log is not None:
+            self.slow_log = bool(slow_log)
+        if slow_ms is not None:
+            self.slow_ms = float(slow_ms)
+        if sample_rate is not None:
+            self.sample_rate = float(sample_rate)
+        logger.info(f"Tracing settings: {self.settings()}")
+        return self.settings()
+
+    def settings(self) -> dict:
+        return {"server_timing": self.server_timing, "slow_log": self.slow_log,
+                "slow_ms": self.slow_ms, "sample_rate": self.sample_rate}
+
+    def stats(self) -> dict:
+        return {**self.settings(), "traced": self.traced, "slow": self.slow, "logged": self.logged}
+
+    def finish(self, trace: RequestTrace, total: float, status: int):
+        if not self.slow_log or total * 1000.0 < self.slow_ms:
+            return
+        self.slow += 1
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self.logged += 1
+        record = {"method": trace.method, "path": trace.path, "status": status,
+                  "total_ms": round(total * 1000.0, 3), "stages": trace.breakdown_ms(), **trace.attrs}
+        logger.warning(f"Slow request {trace.method} {trace.path} {record['total_ms']:.1f}ms "
+                       f"stages={record['stages']}")
+        if self.archive is not None:
+            self.archive.append(record)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that opens a RequestTrace per HTTP request while tracing is
+    enabled. The Server-Timing header covers the stages finished before the
+    response starts (for streamed responses, the part before the first chunk).
+    """
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        tracer = self.tracer
+        if scope["type"] != "http" or not tracer.enabled:
+            return await self.app(scope, receive, send)
+        trace = RequestTrace(scope.get("method", ""), scope["path"])
+        token = _current_trace.set(trace)
+        tracer.traced += 1
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if tracer.server_timing:
+                    header = trace.server_timing(time.perf_counter() - trace.started)
+                    # Timing-Allow-Origin lets the cross-origin frontend read it from the Performance API
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"server-timing", header.encode("latin-1")),
+                                                      (b"timing-allow-origin", b"*")]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            tracer.finish(trace, time.perf_counter() - trace.started, status[0])
@@ -0,0 +1,159 @@
+# backend/app/tts_cache.py
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("tts_cache")
+
+
+class TTSCache:
+    """
+    Disk-backed, content-addressed cache for synthesised audio.
+    Entries are keyed by a hash of everything that affects the audio
+    (text, voice, model, voice settings, output format) and evicted
+    least-recently-used once the total size exceeds max_bytes.
+    With load=False nothing touches the disk until load() is called.
+    """
+    def __init__(self, cache_dir: str = "./data/tts_cache", max_bytes: int = 256 * 1024 * 1024, suffix: str = ".mp3",
+                 load: bool = True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, oldest first
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loaded = False
+        if load:
+            self.load()
+
+    def load(self):
+        """Create the cache directory and index the entries already on disk."""
+        if self.loaded:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._scan()
+        self.loaded = True
+
+    @staticmethod
+    def make_key(text: str, voice: str, model: str, voice_settings: dict = None, output_format: str = None) -> str:
+        payload = json.dumps([text, voice, model, voice_settings or {}, output_format], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def _scan(self):
+        # rebuild LRU order from file mtimes (touched on every hit)
+        files = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp"):
+                # left over from an interrupted write
+                os.remove(path)
+                continue
+            if not name.endswith(self.suffix):
+                continue
+            st = os.stat(path)
+            files.append((st.st_mtime, name[:-len(self.suffix)], st.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+        with self._lock:
+            self._evict_locked()
+        logger.info(f"TTS cache at {self.cache_dir}: {len(self._entries)} entries, {self._bytes} bytes")
+
+    def read(self, key: str):
+        """Return cached audio bytes, or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        writer = self.writer(key)
+        writer.write(data)
+        writer.commit()
+
+    def writer(self, key: str) -> "CacheWriter":
+        return CacheWriter(self, key)
+
+    def _commit(self, key: str, tmp_path: str, size: int):
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._bytes += size
+            self._evict_locked()
+
+    def _evict_locked(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class CacheWriter:
+    """
+    Incremental writer for one cache entry. Data goes to a temp file and only
+    becomes visible on commit(), so partial streams are never served.
+    """
+    def __init__(self, cache: TTSCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.size = 0
+        self._tmp_path = os.path.join(cache.cache_dir, f"{key}.{uuid.uuid4().hex}.tmp")
+        self._f = open(self._tmp_path, "wb")
+
+    def write(self, chunk: bytes):
+        self._f.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        self._f.close()
+        if self.size == 0:
+            os.remove(self._tmp_path)
+            return
+        self.cache._commit(self.key, self._tmp_path, self.size)
+
+    def abort(self):
+        self._f.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Offline micro-benchmarks for the search, embedding, fallback and ingest hot paths.
+
+Usage (from backend/):
+  python -m benchmarks.bench_hotpaths --out benchmarks/results.json
+  python -m benchmarks.bench_hotpaths --save_baseline              # record benchmarks/baseline.json on this machine
+  python -m benchmarks.bench_hotpaths --baseline benchmarks/baseline.json --threshold 0.2
+  python -m benchmarks.bench_hotpaths --only faiss,fallback --sizes 10000,100000,1000000
+
+Uses the bundled artifacts (data/faiss_icd_hnsw.idx, data/icd_meta.npy,
+data/icd_embeddings.npy) when they are real files; when they are missing or
+still git-lfs pointers, an index is built from data/icd_corpus.csv with the
+same embedder and HNSW parameters as ml/build_faiss_index.py. Queries come
+from the holdout TSV. Synthetic scale-ups (--sizes) cluster random vectors
+around the corpus embeddings and are cached under --cache_dir (building the
+1M index at efConstruction=200 takes a while; it is only done once).
+
+Each benchmark reports mean / p50 / p95 / min latency and ops/s. With
+--baseline, any benchmark whose p50 is more than --threshold slower than the
+baseline is reported as a regression and the exit status is 1. Baselines are
+only comparable on the same machine and settings (meta.config is checked).
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench_hotpaths")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GROUPS = ("faiss", "scale", "fallback", "embed", "metadata", "ingest")
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--data_dir", default=os.path.join(BACKEND_DIR, "data"))
+    p.add_argument("--holdout_tsv", default=os.path.join(BACKEND_DIR, "..", "dataset-finetuning", "mnt", "data",
+                                                         "namaste_holdout_eval.tsv"))
+    p.add_argument("--model_dir", default=os.environ.get("FINETUNED_MODEL_DIR", os.path.join(BACKEND_DIR, "models", "gemma_finetuned")))
+    p.add_argument("--sizes", default="10000,100000,1000000", help="synthetic index sizes")
+    p.add_argument("--fallback_max_size", type=int, default=100000, help="largest corpus for the difflib fallback")
+    p.add_argument("--hnsw_m", type=int, default=32)
+    p.add_argument("--ef_construction", type=int, default=200)
+    p.add_argument("--cache_dir", default=os.path.join(BACKEND_DIR, "benchmarks", ".cache"))
+    p.add_argument("--only", default="", help=f"comma-separated groups: {','.join(GROUPS)}")
+    p.add_argument("--repeat", type=int, default=50, help="timed iterations per benchmark")
+    p.add_argument("--warmup", type=int, default=5)
+    p.add_argument("--out", default=os.path.join(BACKEND_DIR, "benchmarks", "results.json"))
+    p.add_argument("--baseline", default="", help="compare against this results file")
+    p.add_argument("--save_baseline", nargs="?", const=os.path.join(BACKEND_DIR, "benchmarks", "baseline.json"),
+                   default="", help="also write the results as the new baseline")
+    p.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown vs baseline (0.2 = 20%%)")
+    return p.parse_args()
+
+
+# ---------------------------------------------------------------- harness
+
+def measure(fn, repeat: int, warmup: int, per_call: int = 1) -> dict:
+    """Time fn() `repeat` times after `warmup` untimed calls. per_call: items handled per call."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    s = np.sort(np.asarray(samples)) * 1000.0
+    mean = float(s.mean())
+    return {
+        "repeat": repeat,
+        "mean_ms": round(mean, 4),
+        "p50_ms": round(float(np.percentile(s, 50)), 4),
+        "p95_ms": round(float(np.percentile(s, 95)), 4),
+        "min_ms": round(float(s[0]), 4),
+        "items_per_s": round(per_call * 1000.0 / mean, 1) if mean else None,
+    }
+
+
+class Suite:
+    def __init__(self, repeat: int, warmup: int):
+        self.repeat = repeat
+        self.warmup = warmup
+        self.results = {}
+
+    def bench(self, name: str, fn, per_call: int = 1, repeat: int = None, **params):
+        stats = measure(fn, repeat or self.repeat, self.warmup, per_call)
+        self.results[name] = {**params, **stats}
+        logger.info(f"{name:56} p50={stats['p50_ms']:9.3f}ms p95={stats['p95_ms']:9.3f}ms")
+        return stats
+
+
+def is_lfs_pointer(path: str) -> bool:
+    if not os.path.exists(path) or os.path.getsize(path) > 1024:
+        return False
+    with open(path, "rb") as f:
+        return f.read(24).startswith(b"version https://git-lfs")
+
+
+def real_file(path: str) -> bool:
+    return os.path.exists(path) and not is_lfs_pointer(path)
+
+
+# ---------------------------------------------------------------- fixtures
+
+def load_queries(path: str):
+    import pandas as pd
+    if not os.path.exists(path):
+        logger.warning(f"Holdout TSV not found at {path}; using ICD terms as queries")
+        return None
+    df = pd.read_csv(path, sep="\t")
+    return df["namaste_english"].fillna(df["namaste_term"]).astype(str).tolist(), df
+
+
+def corpus_texts(meta):
+    return [f"{m['icd_term']} | {m['icd_description']} | {m['icd_code']}" for m in meta]
+
+
+def meta_array(codes, terms, descriptions):
+    # same layout as ml/build_faiss_index.py
+    dtype = np.dtype([('icd_code', 'U64'), ('icd_term', 'U256'), ('icd_description', 'U512')])
+    meta = np.empty(len(codes), dtype=dtype)
+    meta['icd_code'], meta['icd_term'], meta['icd_description'] = codes, terms, descriptions
+    return meta
+
+
+def build_hnsw(vectors, m: int, ef_construction: int):
+    import faiss
+    index = faiss.IndexHNSWFlat(vectors.shape[1], m)
+    index.hnsw.efConstruction = ef_construction
+    index.add(vectors)
+    return index
+
+
+def base_artifacts(args, embed_svc):
+    """(index, meta, embeddings, source) from the bundled files, or rebuilt from icd_corpus.csv."""
+    import faiss
+    idx_path = os.path.join(args.data_dir, "faiss_icd_hnsw.idx")
+    meta_path = os.path.join(args.data_dir, "icd_meta.npy")
+    emb_path = os.path.join(args.data_dir, "icd_embeddings.npy")
+    if real_file(idx_path) and real_file(meta_path):
+        index = faiss.read_index(idx_path)
+        meta = np.load(meta_path, allow_pickle=True)
+        emb = np.load(emb_path).astype("float32") if real_file(emb_path) else index.reconstruct_n(0, index.ntotal)
+        return index, meta, emb, "bundled"
+    import pandas as pd
+    logger.warning("Bundled FAISS artifacts missing or git-lfs pointers; rebuilding from icd_corpus.csv")
+    df = pd.read_csv(os.path.join(args.data_dir, "icd_corpus.csv"), encoding="utf-8").fillna("")
+    # same column handling as ml/build_faiss_index.py
+    df = df.rename(columns={"icd11_code": "icd_code", "icd11_term": "icd_term", "icd11_description": "icd_description"})
+    meta = meta_array(df["icd_code"].astype(str).values, df["icd_term"].astype(str).values,
+                      df["icd_description"].astype(str).values)
+    texts = df["embed_text"].astype(str).tolist() if "embed_text" in df.columns else corpus_texts(meta)
+    emb = embed_svc.embed(texts).astype("float32")
+    return build_hnsw(emb, args.hnsw_m, args.ef_construction), meta, emb, "rebuilt"
+
+
+def synthetic_artifacts(args, base_emb, base_meta, n: int):
+    """n vectors clustered around the corpus embeddings (cached), plus matching metadata."""
+    import faiss
+    os.makedirs(args.cache_dir, exist_ok=True)
+    dim = base_emb.shape[1]
+    tag = f"syn_{n}_d{dim}_m{args.hnsw_m}_ef{args.ef_construction}"
+    idx_path = os.path.join(args.cache_dir, f"{tag}.idx")
+    rng = np.random.RandomState(n)
+    centers = rng.randint(0, len(base_emb), size=n)
+    if os.path.exists(idx_path):
+        index = faiss.read_index(idx_path)
+    else:
+        logger.info(f"Building synthetic HNSW index with {n} vectors (cached at {idx_path})")
+        start = time.perf_counter()
+        vecs = np.empty((n, dim), dtype="float32")
+        for lo in range(0, n, 100000):
+            hi = min(n, lo + 100000)
+            chunk = base_emb[centers[lo:hi]] + 0.05 * rng.standard_normal((hi - lo, dim)).astype("float32")
+            faiss.normalize_L2(chunk)
+            vecs[lo:hi] = chunk
+        index = build_hnsw(vecs, args.hnsw_m, args.ef_construction)
+        del vecs
+        faiss.write_index(index, idx_path)
+        logger.info(f"Built in {time.perf_counter() - start:.1f}s")
+    terms = [f"{base_meta[c]['icd_term']} {i % 997}" for i, c in enumerate(centers)]
+    meta = meta_array([f"SYN{i}" for i in range(n)], terms, base_meta["icd_description"][centers])
+    return index, meta
+
+
+class PrecomputedEmbedder:
+    """Returns fixed query vectors, so scale benchmarks measure FAISS + metadata only."""
+    def __init__(self, texts, vectors):
+        self.lookup = dict(zip(texts, vectors))
+
+    def embed(self, texts):
+        return np.vstack([self.lookup[t] for t in texts])
+
+
+def make_faiss_service(index, meta):
+    from app.faiss_utils import FaissService, LexicalIndex
+    svc = FaissService(load=False)
+    svc.index, svc.meta, svc.n_items, svc.index_loaded = index, meta, len(meta), True
+    svc.icd_list = [str(t) for t in meta["icd_term"]]
+    svc.lexical = LexicalIndex(meta)
+    return svc
+
+
+# ---------------------------------------------------------------- benchmarks
+
+def bench_faiss(suite, svc, embed_svc, queries):
+    it = iter(range(10 ** 9))
+    suite.bench("faiss.search_text_with_embedding[k=5]",
+                lambda: svc.search_text_with_embedding(queries[next(it) % len(queries)], embed_svc, k=5))
+    for bs in (8, 32):
+        batch = queries[:bs]
+        suite.bench(f"faiss.search_batch_with_embedding[batch={bs},k=5]",
+                    lambda b=batch: svc.search_batch_with_embedding(b, embed_svc, k=5), per_call=bs)
+
+
+def bench_scale(suite, args, base_emb, base_meta, embed_svc, queries, sizes):
+    qvecs = embed_svc.embed(queries[:64]).astype("float32")
+    embedder = PrecomputedEmbedder(queries[:64], qvecs)
+    for n in sizes:
+        index, meta = synthetic_artifacts(args, base_emb, base_meta, n)
+        svc = make_faiss_service(index, meta)
+        it = iter(range(10 ** 9))
+        suite.bench(f"scale.search_text_with_embedding[n={n},k=5]",
+                    lambda: svc.search_text_with_embedding(queries[next(it) % 64], embedder, k=5), n=n)
+        suite.bench(f"scale.search_batch_with_embedding[n={n},batch=32,k=5]",
+                    lambda: svc.search_batch_with_embedding(queries[:32], embedder, k=5), per_call=32, n=n)
+        it2 = iter(range(10 ** 9))
+        suite.bench(f"scale.lexical_search[n={n},k=5]",
+                    lambda: svc.lexical_search(queries[next(it2) % len(queries)], k=5), n=n)
+        if n <= args.fallback_max_size:
+            it3 = iter(range(10 ** 9))
+            suite.bench(f"fallback_search_icd[n={n},k=5]",
+                        lambda: fallback(queries[next(it3) % len(queries)], svc.icd_list),
+                        repeat=max(5, min(suite.repeat, 2000000 // n)), n=n)
+        del svc, index, meta
+
+
+def fallback(query, corpus):
+    from app.faiss_utils import fallback_search_icd
+    return fallback_search_icd(query, corpus, k=5)
+
+
+def bench_fallback(suite, meta, queries):
+    corpus = [str(t) for t in meta["icd_term"]]
+    it = iter(range(10 ** 9))
+    suite.bench(f"fallback_search_icd[n={len(corpus)},k=5]",
+                lambda: fallback(queries[next(it) % len(queries)], corpus), n=len(corpus))
+
+
+def bench_embed(suite, embed_svc, queries):
+    for bs in (1, 8, 32, 128):
+        batch = (queries * (bs // len(queries) + 1))[:bs]
+        suite.bench(f"embed[batch={bs}]", lambda b=batch: embed_svc.embed(b), per_call=bs,
+                    repeat=max(5, suite.repeat // max(1, bs // 8)))
+
+
+def bench_metadata(suite, svc):
+    rng = np.random.RandomState(0)
+    for k in (5, 20):
+        ids = rng.randint(0, svc.n_items, size=(256, k))
+        dists = rng.rand(256, k).astype("float32")
+        it = iter(range(10 ** 9))
+
+        def lookup(ids=ids, dists=dists):
+            row = next(it) % 256
+            return svc._candidates(dists[row], ids[row])
+        suite.bench(f"metadata._candidates[k={k}]", lookup)
+
+
+def bench_ingest(suite, holdout_df, tmp_dir):
+    # app.main reads its configuration at import time
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}",
+        "AUTOCODE_ENABLED": "0",
+        "AUDIT_BLOB_DIR": os.path.join(tmp_dir, "audit_blobs"),
+        "TTS_CACHE_DIR": os.path.join(tmp_dir, "tts_cache"),
+        "SLOW_REQUEST_LOG_DIR": os.path.join(tmp_dir, "slow"),
+        "QUERY_CAPTURE_DIR": os.path.join(tmp_dir, "query_log"),
+    })
+    from app import main
+    main.create_db_and_tables(main.engine)
+    # as in the app lifespan: audit events are written by the background thread
+    main.audit_writer.start()
+    rows = holdout_df.to_dict("records")
+
+    def bundle(size, seq):
+        entries = []
+        for i in range(size):
+            r = rows[(seq + i) % len(rows)]
+            entries.append({"resource": {
+                "resourceType": "Condition",
+                "subject": {"reference": f"Patient/bench-{(seq + i) % 500}"},
+                "code": {"coding": [
+                    {"system": "http://namaste.ayush.gov.in/codes", "code": r["namaste_code"], "display": r["namaste_english"]},
+                    {"system": "http://hl7.org/fhir/sid/icd-11", "code": r["icd11_code"], "display": r["icd11_term"]},
+                ]},
+            }})
+        return {"resourceType": "Bundle", "type": "collection", "entry": entries}
+
+    loop = asyncio.new_event_loop()
+    try:
+        for size in (1, 10, 100, 1000):
+            repeat = max(5, suite.repeat // max(1, size // 10))
+            # built up front so only the ingest call is timed
+            bundles = iter([bundle(size, j * size) for j in range(suite.warmup + repeat)])
+            suite.bench(f"ingest_bundle[entries={size}]",
+                        lambda: loop.run_until_complete(main.ingest_bundle(next(bundles), None)),
+                        per_call=size, repeat=repeat, entries=size)
+    finally:
+        loop.close()
+        main.audit_writer.close()
+
+
+# ---------------------------------------------------------------- compare
+
+def compare(current: dict, baseline: dict, threshold: float):
+    """Returns (rows, regressions); a regression is a p50 slower than baseline * (1 + threshold)."""
+    if baseline.get("meta", {}).get("config") != current["meta"]["config"]:
+        logger.warning("Baseline was recorded with different settings; ratios may not be meaningful")
+    rows, regressions = [], []
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            rows.append((name, None, cur["p50_ms"], None, "new"))
+            continue
+        ratio = cur["p50_ms"] / base["p50_ms"] if base["p50_ms"] else float("inf")
+        status = "REGRESSION" if ratio > 1.0 + threshold else ("faster" if ratio < 1.0 - threshold else "ok")
+        rows.append((name, base["p50_ms"], cur["p50_ms"], ratio, status))
+        if status == "REGRESSION":
+            regressions.append(name)
+    for name in baseline.get("results", {}):
+        if name not in current["results"]:
+            rows.append((name, baseline["results"][name]["p50_ms"], None, None, "missing"))
+    return rows, regressions
+
+
+def print_comparison(rows, threshold):
+    print(f"\n{'benchmark':60} {'base p50':>10} {'now p50':>10} {'ratio':>7}  status (threshold {threshold:.0%})")
+    for name, base, cur, ratio, status in rows:
+        fmt = lambda v: f"{v:10.3f}" if v is not None else f"{'-':>10}"
+        r = f"{ratio:7.2f}" if ratio is not None else f"{'-':>7}"
+        print(f"{name:60} {fmt(base)} {fmt(cur)} {r}  {status}")
+
+
+def environment(args, source, embedder, sizes):
+    import faiss
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.time(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "faiss": getattr(faiss, "__version__", None),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "config": {"artifacts": source, "embedder": embedder, "sizes": sizes, "hnsw_m": args.hnsw_m,
+                   "ef_construction": args.ef_construction, "repeat": args.repeat},
+    }
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, BACKEND_DIR)
+    from app.ml_utils import EmbeddingService
+    groups = {g.strip() for g in args.only.split(",") if g.strip()} or set(GROUPS)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    embed_svc = EmbeddingService(model_dir=args.model_dir)
+    embedder = "model" if embed_svc.model_loaded else "dummy"
+    if not embed_svc.model_loaded:
+        logger.warning("No fine-tuned model found; embedding numbers use the deterministic dummy embedder")
+    index, meta, emb, source = base_artifacts(args, embed_svc)
+    loaded = load_queries(args.holdout_tsv)
+    queries, holdout_df = loaded if loaded else ([str(t) for t in meta["icd_term"]], None)
+    svc = make_faiss_service(index, meta)
+
+    suite = Suite(args.repeat, args.warmup)
+    if "faiss" in groups:
+        bench_faiss(suite, svc, embed_svc, queries)
+    if "fallback" in groups:
+        bench_fallback(suite, meta, queries)
+    if "metadata" in groups:
+        bench_metadata(suite, svc)
+    if "embed" in groups:
+        bench_embed(suite, embed_svc, queries)
+    if "scale" in groups and sizes:
+        bench_scale(suite, args, emb, meta, embed_svc, queries, sizes)
+    if "ingest" in groups:
+        if holdout_df is None:
+            logger.warning("Skipping ingest benchmarks: holdout TSV not available")
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                bench_ingest(suite, holdout_df, tmp)
+
+    report = {"meta": environment(args, source, embedder, sizes), "results": suite.results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote {len(suite.results)} results to {args.out}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            logger.error(f"Baseline {args.baseline} not found; record one with --save_baseline")
+            return 2
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(report, baseline, args.threshold)
+        print_comparison(rows, args.threshold)
+        if regressions:
+            logger.error(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: "
+                         f"{', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the ElevenLabs API, for load tests and replays.
+
+Usage (from backend/):
+  python scripts/elevenlabs_stub.py --port 8900 --stt_ms 400 --tts_ms 250 --error_rate 0.01
+  ELEVEN_API_BASE=http://127.0.0.1:8900 ELEVEN_API_KEY=stub uvicorn app.main:app --port 8010
+
+Serves the endpoints app/elevenlabs.py calls with configurable latency (plus
+uniform jitter) and a configurable rate of 503s, so the backend's retry,
+breaker and cache paths are exercised without calling the real service.
+GET /stats returns request counts.
+"""
+import asyncio
+import random
+import argparse
+import logging
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("elevenlabs_stub")
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8900)
+    p.add_argument("--stt_ms", type=float, default=400.0, help="speech-to-text latency")
+    p.add_argument("--tts_ms", type=float, default=250.0, help="text-to-speech latency (time to first byte when streaming)")
+    p.add_argument("--jitter_ms", type=float, default=50.0)
+    p.add_argument("--error_rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    p.add_argument("--audio_bytes", type=int, default=48000, help="size of the returned audio")
+    p.add_argument("--chunk_ms", type=float, default=20.0, help="delay between streamed audio chunks")
+    return p.parse_args()
+
+
+def create_app(args) -> FastAPI:
+    app = FastAPI(title="ElevenLabs stub")
+    stats = {"stt": 0, "tts": 0, "tts_stream": 0, "errors": 0}
+    # an MPEG frame header followed by padding: enough for clients that sniff the format
+    audio = (b"\xff\xfb\x90\x64" + b"\x00" * 413) * (args.audio_bytes // 417 + 1)
+    audio = audio[:args.audio_bytes]
+
+    async def delay(ms):
+        await asyncio.sleep(max(0.0, ms + random.uniform(-args.jitter_ms, args.jitter_ms)) / 1000.0)
+
+    def failed():
+        if random.random() < args.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=503, content={"detail": "stub: injected failure"})
+        return None
+
+    @app.post("/v1/speech-to-text")
+    async def speech_to_text(request: Request):
+        stats["stt"] += 1
+        form = await request.form()
+        await delay(args.stt_ms)
+        error = failed()
+        if error is not None:
+            return error
+        upload = form.get("file")
+        size = len(await upload.read()) if upload is not None and hasattr(upload, "read") else 0
+        return {"language_code": "eng", "language_probability": 1.0,
+                "text": f"patient reports fever and cough for three days ({size} bytes of audio)", "words": []}
+
+    @app.post("/v1/text-to-speech/{voice_id}")
+    async def text_to_speech(voice_id: str, request: Request):
+        stats["tts"] += 1
+        await request.body()
+        await delay(args.tts_ms)
+        return failed() or Response(content=audio, media_type="audio/mpeg")
+
+    @app.post("/v1/text-to-speech/{voice_id}/stream")
+    async def text_to_speech_stream(voice_id: str, request: Request):
+        stats["tts_stream"] += 1
+        await request.body()
+        await delay(args.tts_ms)
+        error = failed()
+        if error is not None:
+            return error
+
+        async def chunks(size=4096):
+            for i in range(0, len(audio), size):
+                yield audio[i:i + size]
+                await asyncio.sleep(args.chunk_ms / 1000.0)
+        return StreamingResponse(chunks(), media_type="audio/mpeg")
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    args = parse_args()
+    logger.info(f"ElevenLabs stub on http://{args.host}:{args.port} (stt={args.stt_ms}ms tts={args.tts_ms}ms "
+                f"error_rate={args.error_rate})")
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Replay captured requests against a running backend and report latency.
+
+Capture (on the server being measured, or on production):
+  QUERY_CAPTURE=1 uvicorn app.main:app ...      # or POST /admin/querylog {"enabled": true} (X-Admin-Token)
+  -> anonymised segments in QUERY_CAPTURE_DIR (default ./data/query_log)
+
+Replay (from backend/), with ElevenLabs replaced by the local stub:
+  python scripts/elevenlabs_stub.py --port 8900 &
+  ELEVEN_API_BASE=http://127.0.0.1:8900 ELEVEN_API_KEY=stub DATABASE_URL=sqlite:///./data/replay.db \\
+      uvicorn app.main:app --port 8010 &
+  python scripts/replay_queries.py --log_dir data/query_log --target http://localhost:8010 --speed 1
+  python scripts/replay_queries.py --log_dir data/query_log --speed 5          # 5x the captured rate
+  python scripts/replay_queries.py --log_dir data/query_log --concurrency 16   # closed loop, as fast as possible
+
+--speed keeps the captured inter-arrival times (divided by the speed), so bursts
+are reproduced; --concurrency ignores timing and keeps N requests in flight.
+Ingest requests write Conditions: point the target at a scratch database.
+
+Reports throughput, p50/p95/p99 latency and error rates per endpoint, next to the
+latency recorded at capture time; --out also writes the report as JSON.
+"""
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import asyncio
+import argparse
+import logging
+
+import httpx
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("replay_queries")
+# one log line per replayed request would distort the client's own timing
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--log_dir", default=os.environ.get("QUERY_CAPTURE_DIR", "./data/query_log"))
+    p.add_argument("--target", default="http://localhost:8010")
+    mode = p.add_mutually_exclusive_group()
+    mode.add_argument("--speed", type=float, default=1.0, help="replay at N x the captured arrival rate")
+    mode.add_argument("--concurrency", type=int, default=0, help="closed loop with N requests in flight")
+    p.add_argument("--max_inflight", type=int, default=256, help="cap on open requests in --speed mode")
+    p.add_argument("--paths", default="", help="comma-separated endpoints to replay (default: all captured)")
+    p.add_argument("--limit", type=int, default=0, help="replay at most N requests")
+    p.add_argument("--loops", type=int, default=1, help="replay the log N times")
+    p.add_argument("--timeout", type=float, default=60.0)
+    p.add_argument("--out", default="", help="write the report as JSON")
+    return p.parse_args()
+
+
+def load_log(log_dir, paths=None, limit=0):
+    """Captured records with a body, oldest first."""
+    records = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "queries-*.jsonl.gz"))):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                if rec.get("body") is None or (paths and rec["path"] not in paths):
+                    continue
+                records.append(rec)
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Results:
+    def __init__(self):
+        self.by_path = {}
+
+    def add(self, path, status, latency_ms, captured_ms):
+        r = self.by_path.setdefault(path, {"latency": [], "captured": [], "status": {}, "errors": 0})
+        r["latency"].append(latency_ms)
+        if captured_ms is not None:
+            r["captured"].append(captured_ms)
+        key = str(status) if status else "exception"
+        r["status"][key] = r["status"].get(key, 0) + 1
+        if not status or status >= 500:
+            r["errors"] += 1
+
+    def report(self, wall_s):
+        out = {}
+        for path, r in sorted(self.by_path.items()):
+            lat, cap = sorted(r["latency"]), sorted(r["captured"])
+            n = len(lat)
+            out[path] = {
+                "requests": n,
+                "throughput_rps": round(n / wall_s, 2) if wall_s else None,
+                "error_rate": round(r["errors"] / n, 4) if n else 0.0,
+                "client_error_rate": round(sum(c for s, c in r["status"].items() if s.startswith("4")) / n, 4) if n else 0.0,
+                "status": r["status"],
+                "p50_ms": percentile(lat, 50), "p95_ms": percentile(lat, 95), "p99_ms": percentile(lat, 99),
+                "max_ms": lat[-1] if lat else None,
+                "captured_p50_ms": percentile(cap, 50), "captured_p95_ms": percentile(cap, 95),
+                "captured_p99_ms": percentile(cap, 99),
+            }
+        return out
+
+
+async def send(client, rec, results):
+    url = rec["path"] + (f"?{rec['query_string']}" if rec.get("query_string") else "")
+    # X-Replay keeps a capture-enabled target from recording the replay itself
+    headers = {"Content-Type": rec.get("content_type") or "application/json", "X-Replay": "1"}
+    start = time.perf_counter()
+    status = None
+    try:
+        resp = await client.post(url, content=rec["body"].encode("utf-8"), headers=headers)
+        await resp.aread()
+        status = resp.status_code
+    except httpx.HTTPError as e:
+        logger.debug(f"{url}: {e}")
+    results.add(rec["path"], status, round((time.perf_counter() - start) * 1000.0, 3), rec.get("latency_ms"))
+
+
+async def replay_timed(client, records, speed, max_inflight, results):
+    """Open loop: request i is sent at (ts_i - ts_0) / speed, whatever the server does."""
+    sem = asyncio.Semaphore(max_inflight)
+    t0 = records[0]["ts"]
+    start = time.perf_counter()
+    tasks = []
+
+    async def one(rec):
+        try:
+            await send(client, rec, results)
+        finally:
+            sem.release()
+
+    late = 0
+    for rec in records:
+        delay = (rec["ts"] - t0) / speed - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await sem.acquire()
+        if (rec["ts"] - t0) / speed - (time.perf_counter() - start) < -0.1:
+            late += 1
+        tasks.append(asyncio.create_task(one(rec)))
+    await asyncio.gather(*tasks)
+    if late:
+        logger.warning(f"{late} requests started >100ms behind schedule (client or max_inflight limit)")
+
+
+async def replay_closed(client, records, concurrency, results):
+    it = iter(records)
+
+    async def worker():
+        for rec in it:
+            await send(client, rec, results)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def run(args):
+    paths = {p.strip() for p in args.paths.split(",") if p.strip()}
+    base = load_log(args.log_dir, paths, args.limit)
+    if not base:
+        logger.error(f"No replayable records in {args.log_dir}")
+        return None
+    # consecutive loops follow each other in time
+    span = base[-1]["ts"] - base[0]["ts"] + 1.0
+    records = [{**r, "ts": r["ts"] + i * span} for i in range(max(1, args.loops)) for r in base]
+    mode = f"concurrency={args.concurrency}" if args.concurrency else f"speed={args.speed}x"
+    logger.info(f"Replaying {len(records)} requests against {args.target} ({mode})")
+
+    results = Results()
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.max_inflight))
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        if args.concurrency:
+            await replay_closed(client, records, args.concurrency, results)
+        else:
+            await replay_timed(client, records, args.speed, args.max_inflight, results)
+        wall = time.perf_counter() - start
+    return {"target": args.target, "mode": mode, "requests": len(records), "wall_s": round(wall, 3),
+            "throughput_rps": round(len(records) / wall, 2), "endpoints": results.report(wall)}
+
+
+def print_report(report):
+    print(f"\n{report['requests']} requests in {report['wall_s']}s ({report['throughput_rps']} req/s, {report['mode']})")
+    print(f"{'endpoint':32} {'n':>6} {'rps':>8} {'err%':>6} {'4xx%':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'cap p95':>9}")
+    fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+    for path, r in report["endpoints"].items():
+        print(f"{path:32} {r['requests']:6d} {r['throughput_rps']:8.1f} {r['error_rate'] * 100:6.2f} "
+              f"{r['client_error_rate'] * 100:6.2f} {fmt(r['p50_ms'])} {fmt(r['p95_ms'])} {fmt(r['p99_ms'])} "
+              f"{fmt(r['captured_p95_ms'])}")
+
+
+def main():
+    args = parse_args()
+    report = asyncio.run(run(args))
+    if report is None:
+        return 1
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Report written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
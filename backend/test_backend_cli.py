@@ -152,7 +152,7 @@ def print_search_results(results: Dict[str, Any]):
         return
     
     source = results.get('source', 'unknown')
-    source_emoji = "🧠" if source == "faiss" else "🔍" if source == "fuzzy" else "⚡"
+    source_emoji = "🧠" if source == "faiss" else "🔍" if source in ("fuzzy", "lexical") else "⚡"
     print(f"{source_emoji} Search Results (Source: {source}):")
     
     candidates = results.get('candidates', [])